@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
+from pydantic.main import BaseModel
+from pydantic.fields import Field
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import partial
 from enum import Enum
 
+_utcnow = partial(datetime.now, timezone.utc)
+
 class MessageRole(str, Enum):
     USER = "user"
     ASSISTANT = "assistant"
@@ -14,23 +18,40 @@ class ChatMessage(BaseModel):
     user_id: str = Field(..., description="ID of the user")
     role: MessageRole = Field(..., description="Message role (user/assistant/system)")
     content: str = Field(..., description="Message content")
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=_utcnow)
     
     # Metadata for context
-    user_mood_context: Optional[dict] = Field(None, description="User's recent mood data")
-    user_missions_context: Optional[dict] = Field(None, description="User's mission completion data")
+    user_mood_context: dict | None = Field(None, description="User's recent mood data")
+    user_missions_context: dict | None = Field(None, description="User's mission completion data")
+
+@dataclass(slots=True)
+class ChatMessageRecord:
+    """Internal counterpart of ChatMessage for trusted data (no validation)"""
+    id: str
+    conversation_id: str
+    user_id: str
+    role: MessageRole
+    content: str
+    timestamp: datetime = field(default_factory=_utcnow)
+    user_mood_context: dict | None = None
+    user_missions_context: dict | None = None
+
+    def to_document(self) -> dict:
+        """Shallow dict for Mongo, dropping unset optional context fields"""
+        doc = {name: getattr(self, name) for name in self.__slots__}
+        return {key: value for key, value in doc.items() if value is not None}
 
 class ChatConversation(BaseModel):
     id: str = Field(..., description="Unique conversation ID")
     user_id: str = Field(..., description="ID of the user")
     title: str = Field("Nova Conversa", description="Conversation title")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
     message_count: int = Field(0, description="Total number of messages")
     
 class SendMessageRequest(BaseModel):
     message: str = Field(..., description="User message to send")
-    conversation_id: Optional[str] = Field(None, description="Existing conversation ID (optional for new conversation)")
+    conversation_id: str | None = Field(None, description="Existing conversation ID (optional for new conversation)")
     
 class ChatResponse(BaseModel):
     message: str = Field(..., description="AI response")
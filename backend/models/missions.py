@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
+from pydantic.main import BaseModel
+from pydantic.fields import Field
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import partial
 from enum import Enum
 
+_utcnow = partial(datetime.now, timezone.utc)
+
 class MissionCategory(str, Enum):
     MINDFULNESS = "mindfulness"
     GRATITUDE = "gratitude"
@@ -27,15 +31,29 @@ class Mission(BaseModel):
     xp_reward: int = Field(..., description="XP reward for completion")
     min_level: int = Field(1, description="Minimum user level required")
     icon: str = Field(..., description="Icon name for the mission")
-    tips: Optional[List[str]] = Field(None, description="Tips for completing the mission")
+    tips: list[str] | None = Field(None, description="Tips for completing the mission")
     estimated_minutes: int = Field(..., description="Estimated time to complete in minutes")
 
+@dataclass(slots=True, frozen=True)
+class MissionDef:
+    """Immutable catalog entry; Mission remains the API-facing shape"""
+    id: str
+    title: str
+    description: str
+    category: MissionCategory
+    difficulty: MissionDifficulty
+    xp_reward: int
+    icon: str
+    estimated_minutes: int
+    min_level: int = 1
+    tips: tuple[str, ...] = ()
+
 class DailyMissionSet(BaseModel):
     id: str = Field(..., description="Unique daily set ID")
     date: datetime = Field(..., description="Date for these missions")
-    missions: List[str] = Field(..., description="List of mission IDs for this day")
+    missions: tuple[str, ...] = Field(..., description="Mission IDs for this day")
     user_id: str = Field(..., description="User ID (for personalization)")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_utcnow)
 
 class UserMissionProgress(BaseModel):
     id: str = Field(..., description="Unique progress ID")
@@ -43,5 +61,16 @@ class UserMissionProgress(BaseModel):
     mission_id: str = Field(..., description="Mission ID")
     date: datetime = Field(..., description="Date of completion")
     completed: bool = Field(False, description="Whether mission was completed")
-    completed_at: Optional[datetime] = Field(None, description="When mission was completed")
-    xp_earned: int = Field(0, description="XP earned from this mission")
\ No newline at end of file
+    completed_at: datetime | None = Field(None, description="When mission was completed")
+    xp_earned: int = Field(0, description="XP earned from this mission")
+
+@dataclass(slots=True)
+class UserMissionProgressRecord:
+    """Internal counterpart of UserMissionProgress for trusted data (no validation)"""
+    id: str
+    user_id: str
+    mission_id: str
+    date: datetime
+    completed: bool = False
+    completed_at: datetime | None = None
+    xp_earned: int = 0
\ No newline at end of file
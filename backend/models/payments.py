@@ -1,31 +1,36 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Dict
-from datetime import datetime
-from bson import ObjectId
+from pydantic.main import BaseModel
+from pydantic.config import ConfigDict
+from pydantic.fields import Field
+from pydantic.functional_serializers import field_serializer
+from typing import NamedTuple
+from types import MappingProxyType
+from datetime import datetime, timezone
+from functools import partial
+
+_utcnow = partial(datetime.now, timezone.utc)
 
 class PaymentTransaction(BaseModel):
-    id: Optional[str] = Field(None, alias="_id")
-    user_id: Optional[str] = None
-    session_id: Optional[str] = None  # For ebook purchases
-    stripe_session_id: Optional[str] = None  # For subscription purchases
-    payment_id: Optional[str] = None
-    plan_id: Optional[str] = None  # For subscription purchases
+    id: str | None = Field(None, alias="_id")
+    user_id: str | None = None
+    session_id: str | None = None  # For ebook purchases
+    stripe_session_id: str | None = None  # For subscription purchases
+    payment_id: str | None = None
+    plan_id: str | None = None  # For subscription purchases
     amount: float
     currency: str = "brl"
     payment_status: str = "pending"  # pending, paid, failed, expired
     status: str = "initiated"  # initiated, completed, cancelled
-    ebook_id: Optional[str] = None
-    ebook_title: Optional[str] = None
-    metadata: Optional[Dict[str, str]] = {}
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: Optional[datetime] = None
-
-    class Config:
-        populate_by_name = True
-        json_encoders = {
-            ObjectId: str,
-            datetime: lambda dt: dt.isoformat()
-        }
+    ebook_id: str | None = None
+    ebook_title: str | None = None
+    metadata: dict[str, str] | None = Field(default_factory=dict)
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime | None = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    @field_serializer('created_at', 'updated_at', when_used='json')
+    def serialize_datetime(self, dt: datetime | None) -> str | None:
+        return dt.isoformat() if dt else None
 
 class EbookPackage(BaseModel):
     id: str
@@ -34,6 +39,13 @@ class EbookPackage(BaseModel):
     category: str
     currency: str = "brl"
 
+class EbookPackageInfo(NamedTuple):
+    id: str
+    title: str
+    price: float
+    category: str
+    currency: str
+
 # Definindo pacotes fixos de ebooks (segurança - preços definidos no backend)
 EBOOK_PACKAGES = {
     "mindfulness": EbookPackage(
@@ -60,4 +72,12 @@ EBOOK_PACKAGES = {
         price=34.90,
         category="Vida Profissional"
     )
-}
\ No newline at end of file
+}
+
+# Visões imutáveis pré-calculadas dos pacotes (usadas pelos handlers)
+EBOOK_PACKAGE_DICTS = MappingProxyType({
+    key: package.model_dump() for key, package in EBOOK_PACKAGES.items()
+})
+EBOOK_PACKAGE_TUPLES = MappingProxyType({
+    key: EbookPackageInfo(**data) for key, data in EBOOK_PACKAGE_DICTS.items()
+})
\ No newline at end of file
@@ -1,24 +1,45 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Query, BackgroundTasks
+from fastapi.responses import ORJSONResponse, StreamingResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
 import logging
 import json
+import hashlib
+import orjson
+import base64
+import binascii
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr, validator
 from typing import List, Optional
 import uuid
+from dataclasses import asdict
+from functools import lru_cache
+from types import MappingProxyType
 from datetime import datetime, timedelta
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from jose import JWTError, jwt
+from cachetools import TTLCache
 import re
 import mercadopago
+import stripe
 from openai import AsyncOpenAI
-from models.chat import ChatMessage, ChatConversation, SendMessageRequest, ChatResponse, MessageRole
-from models.missions import Mission, MissionCategory, MissionDifficulty, DailyMissionSet, UserMissionProgress
-from models.payments import PaymentTransaction, EbookPackage, EBOOK_PACKAGES
+from models.chat import ChatMessageRecord, ChatConversation, SendMessageRequest, ChatResponse, MessageRole
+from models.missions import MissionDef, MissionCategory, MissionDifficulty, DailyMissionSet, UserMissionProgressRecord
+from models.payments import PaymentTransaction, EbookPackage, EBOOK_PACKAGE_DICTS, EBOOK_PACKAGE_TUPLES
 from enum import Enum
 
 ROOT_DIR = Path(__file__).parent
@@ -26,9 +47,64 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 50)),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', 10)),
+    serverSelectionTimeoutMS=5000,
+    connectTimeoutMS=3000,
+    # Fail fast instead of piling requests up behind a stalled server or an exhausted pool
+    socketTimeoutMS=10000,
+    waitQueueTimeoutMS=2000,
+    # Recycle sockets idle well past normal traffic gaps; the warm minPoolSize stays open
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 600000)),
+    retryWrites=True,
+    compressors="zlib"
+)
 db = client.get_database('mental_health_app')
 
+# Public base URL used to build profile photo links (falls back to the request URL)
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '').rstrip('/')
+
+class _UUIDPool:
+    """Random bytes for uuid4 ids, read from the OS in blocks instead of 16 bytes at a time"""
+    BLOCK = 16 * 256
+
+    def __init__(self):
+        self._buf = b""
+        self._off = 0
+
+    def reset(self):
+        # A forked worker must never reuse bytes its parent already handed out
+        self._buf = b""
+        self._off = 0
+
+    def next_hex(self) -> str:
+        if self._off >= len(self._buf):
+            self._buf = os.urandom(self.BLOCK)
+            self._off = 0
+        chunk = self._buf[self._off:self._off + 16]
+        self._off += 16
+        return uuid.UUID(bytes=chunk, version=4).hex
+
+_uuid_pool = _UUIDPool()
+os.register_at_fork(after_in_child=_uuid_pool.reset)
+
+def _new_id() -> str:
+    """New random document id (uuid4 as 32 hex chars, no dashes)"""
+    return _uuid_pool.next_hex()
+
+_EPOCH = datetime(1970, 1, 1)
+
+@lru_cache(maxsize=2)
+def _utc_day_start(day_number: int) -> datetime:
+    """Naive UTC midnight of a day counted from the Unix epoch"""
+    return _EPOCH + timedelta(days=day_number)
+
+def utc_today_start() -> datetime:
+    """Naive UTC midnight of the current day (memoized, changes once a day)"""
+    return _utc_day_start(int(time.time() // 86400))
+
 # Mercado Pago configuration
 MERCADO_PAGO_ACCESS_TOKEN = os.environ.get('MERCADO_PAGO_ACCESS_TOKEN')
 if MERCADO_PAGO_ACCESS_TOKEN:
@@ -36,6 +112,28 @@ if MERCADO_PAGO_ACCESS_TOKEN:
 else:
     sdk = None
 
+# Stripe configuration (ebooks e licenças corporativas)
+STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
+if STRIPE_API_KEY:
+    # Um único client por processo para reaproveitar o pool de conexões HTTP
+    stripe_client = stripe.StripeClient(STRIPE_API_KEY, http_client=stripe.HTTPXClient())
+else:
+    stripe_client = None
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+
+# OpenAI client (chat terapeuta), criado sob demanda e reaproveitado entre mensagens
+openai_client: Optional[AsyncOpenAI] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the process-wide OpenAI client, creating it on first use"""
+    global openai_client
+    if openai_client is None:
+        api_key = os.environ.get('OPENAI_API_KEY')
+        if not api_key:
+            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+        openai_client = AsyncOpenAI(api_key=api_key)
+    return openai_client
+
 # Subscription-related classes
 class PlanType(str, Enum):
     MONTHLY = "monthly"
@@ -84,8 +182,20 @@ SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-here-change-in-pr
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Verified tokens are cached per process for a short time so authenticated
+# requests skip jwt.decode + users lookup. Trade-off: a deleted user keeps
+# access for up to AUTH_CACHE_TTL_SECONDS on workers that already cached them.
+AUTH_CACHE_TTL_SECONDS = 30
+_auth_cache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL_SECONDS)
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """Last-resort 500 for handlers that don't translate their own errors"""
+    logger.error("Unhandled error on %s %s: %s", request.method, request.url.path, exc)
+    return ORJSONResponse(status_code=500, content={"detail": "Erro interno do servidor"})
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -121,6 +231,8 @@ class UserCreate(BaseModel):
         return v
 
 # Mood Models
+VALID_MOOD_EMOJIS = frozenset({'😢', '😞', '😐', '😊', '😄'})
+
 class MoodCreate(BaseModel):
     mood_level: int = Field(..., ge=1, le=5, description="Nível do humor de 1 (muito triste) a 5 (muito feliz)")
     mood_emoji: str
@@ -128,13 +240,12 @@ class MoodCreate(BaseModel):
     
     @validator('mood_emoji')
     def validate_emoji(cls, v):
-        valid_emojis = ['😢', '😞', '😐', '😊', '😄']
-        if v not in valid_emojis:
+        if v not in VALID_MOOD_EMOJIS:
             raise ValueError('Emoji de humor inválido')
         return v
 
 class MoodEntry(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_new_id)
     user_id: str
     mood_level: int
     mood_emoji: str
@@ -153,7 +264,7 @@ class MissionCompleteRequest(BaseModel):
     mission_id: str
 
 class DailyMissions(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_new_id)
     user_id: str
     date: datetime = Field(default_factory=datetime.utcnow)
     meditate_completed: bool = False
@@ -176,7 +287,7 @@ class DailyMissionsResponse(BaseModel):
     possible_xp: int  # Possible stars for today
 
 class UserStats(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_new_id)
     user_id: str
     total_xp: int = 0
     current_level: int = 1
@@ -193,6 +304,21 @@ class UserStatsResponse(BaseModel):
     level_description: str
     level_tier: str
 
+# Raster formats accepted for profile photos; SVG is excluded since it can carry scripts
+PROFILE_PHOTO_TYPES = frozenset({'image/png', 'image/jpeg', 'image/webp', 'image/gif'})
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """Identify an accepted image format from its magic bytes"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
 class ProfilePhotoUpdate(BaseModel):
     profile_photo: str
     
@@ -201,9 +327,12 @@ class ProfilePhotoUpdate(BaseModel):
         if not v:
             raise ValueError('Foto não pode estar vazia')
         
-        # Check if it's a valid base64 string with image format
-        if not v.startswith('data:image/'):
+        # Expect "data:<type>;base64,<payload>" with an accepted raster type and a payload
+        header, comma, encoded = v.partition(',')
+        if not header.startswith('data:') or header[len('data:'):].split(';')[0] not in PROFILE_PHOTO_TYPES:
             raise ValueError('Formato de imagem inválido')
+        if not comma or not encoded:
+            raise ValueError('Foto não pode estar vazia')
             
         # Basic size check (rough estimate: base64 is ~4/3 the size of original)
         if len(v) > 10 * 1024 * 1024:  # ~7.5MB original image
@@ -216,7 +345,7 @@ class UserLogin(BaseModel):
     password: str
 
 class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_new_id)
     name: str
     email: str
     profile_photo: Optional[str] = None
@@ -228,22 +357,51 @@ class Token(BaseModel):
     user: User
 
 class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_new_id)
     client_name: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class StatusCheckPage(BaseModel):
+    items: List[StatusCheck]
+    next_cursor: Optional[str] = None
+
+# Password hashing (Argon2id, OWASP 46 MiB profile). Legacy bcrypt hashes
+# are still accepted and upgraded on the next successful login.
+password_hasher = PasswordHasher(time_cost=2, memory_cost=46 * 1024, parallelism=1)
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+# Hashing runs off the event loop in a small dedicated pool; each Argon2 call
+# holds 46 MiB, so the pool size also caps memory used by login bursts.
+password_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="password")
+
 # Helper functions
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    """Hash a password using Argon2id"""
+    return password_hasher.hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    """Verify a password against its hash (Argon2id or legacy bcrypt)"""
+    if hashed.startswith(BCRYPT_PREFIXES):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    try:
+        return password_hasher.verify(hashed, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(hashed: str) -> bool:
+    """Check if a stored hash should be replaced with a current Argon2id hash"""
+    return hashed.startswith(BCRYPT_PREFIXES) or password_hasher.check_needs_rehash(hashed)
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(password_executor, hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(password_executor, verify_password, password, hashed)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -256,8 +414,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Campos do usuário necessários para autenticação; profile_photo (base64, pode ter MBs)
+# fica de fora e só é lido nas rotas que o devolvem ao cliente
+USER_AUTH_PROJECTION = {"_id": 1, "id": 1, "name": 1, "email": 1, "created_at": 1}
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user from JWT token"""
+    cache_key = hashlib.sha256(credentials.credentials.encode('utf-8')).hexdigest()
+    cached = _auth_cache.get(cache_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -271,23 +438,27 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
-    user = await db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email}, USER_AUTH_PROJECTION)
     if user is None:
         raise credentials_exception
     
-    return User(
+    current_user = User(
         id=user.get('id', str(user['_id'])),  # Prefer 'id' field, fallback to _id
         name=user['name'],
         email=user['email'],
-        profile_photo=user.get('profile_photo'),
         created_at=user['created_at']
     )
+    # Tokens without an expiry are still honoured, just never cached
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        _auth_cache[cache_key] = (current_user, expires_at)
+    return current_user
 
 # Auth Routes
 @api_router.post("/register", response_model=Token)
 async def register_user(user_data: UserCreate):
     # Check if user already exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    existing_user = await db.users.find_one({"email": user_data.email}, {"_id": 1})
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -296,10 +467,10 @@ async def register_user(user_data: UserCreate):
     
     # Create new user
     user_dict = {
-        "id": str(uuid.uuid4()),
+        "id": _new_id(),
         "name": user_data.name,
         "email": user_data.email,
-        "password": hash_password(user_data.password),
+        "password": await hash_password_async(user_data.password),
         "created_at": datetime.utcnow()
     }
     
@@ -329,7 +500,7 @@ async def register_user(user_data: UserCreate):
     )
 
 @api_router.post("/login", response_model=Token)
-async def login_user(user_data: UserLogin):
+async def login_user(user_data: UserLogin, request: Request):
     # Find user by email
     user = await db.users.find_one({"email": user_data.email})
     if not user:
@@ -339,12 +510,19 @@ async def login_user(user_data: UserLogin):
         )
     
     # Verify password
-    if not verify_password(user_data.password, user['password']):
+    if not await verify_password_async(user_data.password, user['password']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou senha incorretos"
         )
     
+    # Upgrade legacy/outdated hashes now that we have the plain password
+    if password_needs_rehash(user['password']):
+        await db.users.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"password": await hash_password_async(user_data.password)}}
+        )
+    
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -355,7 +533,7 @@ async def login_user(user_data: UserLogin):
         id=str(user['_id']),  # Use _id from MongoDB
         name=user['name'],
         email=user['email'],
-        profile_photo=user.get('profile_photo'),
+        profile_photo=profile_photo_url(request, user),
         created_at=user['created_at']
     )
     
@@ -365,84 +543,139 @@ async def login_user(user_data: UserLogin):
         user=user_obj
     )
 
+def get_photo_bucket() -> AsyncIOMotorGridFSBucket:
+    """GridFS bucket holding profile photos"""
+    return AsyncIOMotorGridFSBucket(db, bucket_name="profile_photos")
+
+def profile_photo_url(request: Request, user: dict) -> Optional[str]:
+    """Public URL of the user's photo (legacy users may still have an inline data URI)"""
+    photo_id = user.get('profile_photo_id')
+    if photo_id:
+        base_url = PUBLIC_BASE_URL or str(request.base_url).rstrip('/')
+        return f"{base_url}/api/profile/photo/{photo_id}"
+    return user.get('profile_photo')
+
 @api_router.get("/me", response_model=User)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return current_user
+async def get_current_user_info(request: Request, current_user: User = Depends(get_current_user)):
+    # get_current_user skips the photo, so fetch it only here
+    user = await db.users.find_one(
+        {"email": current_user.email},
+        {"_id": 0, "profile_photo_id": 1, "profile_photo": 1}
+    )
+    return current_user.model_copy(update={"profile_photo": profile_photo_url(request, user) if user else None})
 
 @api_router.put("/profile/photo", response_model=User)
-async def update_profile_photo(photo_data: ProfilePhotoUpdate, current_user: User = Depends(get_current_user)):
-    # Update user profile photo in database
-    await db.users.update_one(
+async def update_profile_photo(photo_data: ProfilePhotoUpdate, request: Request, current_user: User = Depends(get_current_user)):
+    # Split the data URI ("data:image/png;base64,...") into content type and bytes
+    header, _, encoded = photo_data.profile_photo.partition(',')
+    content_type = header[len('data:'):].split(';')[0]
+    try:
+        photo_bytes = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Formato de imagem inválido")
+    # The declared type must match the actual bytes; it is what the photo is served as
+    if sniff_image_type(photo_bytes) != content_type:
+        raise HTTPException(status_code=400, detail="Formato de imagem inválido")
+    
+    # Store the photo in GridFS; the user document keeps only its id
+    bucket = get_photo_bucket()
+    photo_id = _new_id()
+    await bucket.upload_from_stream_with_id(
+        photo_id,
+        f"{current_user.id}/{photo_id}",
+        photo_bytes,
+        metadata={"user_id": current_user.id, "content_type": content_type}
+    )
+    
+    previous_user = await db.users.find_one_and_update(
         {"id": current_user.id},
-        {"$set": {"profile_photo": photo_data.profile_photo}}
+        {"$set": {"profile_photo_id": photo_id}, "$unset": {"profile_photo": ""}},
+        {"profile_photo_id": 1},
+        return_document=ReturnDocument.BEFORE
     )
     
-    # Get updated user data
-    updated_user = await db.users.find_one({"id": current_user.id})
+    # Remove the replaced photo
+    previous_photo_id = previous_user.get('profile_photo_id') if previous_user else None
+    if previous_photo_id:
+        try:
+            await bucket.delete(previous_photo_id)
+        except NoFile:
+            pass
     
-    return User(
-        id=updated_user['id'],
-        name=updated_user['name'],
-        email=updated_user['email'],
-        profile_photo=updated_user.get('profile_photo'),
-        created_at=updated_user['created_at']
+    return current_user.model_copy(update={"profile_photo": profile_photo_url(request, {"profile_photo_id": photo_id})})
+
+@api_router.get("/profile/photo/{photo_id}")
+async def get_profile_photo(photo_id: str):
+    """Stream a profile photo from GridFS"""
+    try:
+        grid_out = await get_photo_bucket().open_download_stream(photo_id)
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Foto não encontrada")
+    
+    async def iter_chunks():
+        while chunk := await grid_out.readchunk():
+            yield chunk
+    
+    content_type = (grid_out.metadata or {}).get("content_type")
+    if content_type not in PROFILE_PHOTO_TYPES:
+        content_type = "application/octet-stream"
+    
+    # Each upload gets a new id, so the content behind a URL never changes.
+    # The photo is served from the API origin: never let it be sniffed or run as a document
+    return StreamingResponse(
+        iter_chunks(),
+        media_type=content_type,
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "X-Content-Type-Options": "nosniff",
+            "Content-Security-Policy": "default-src 'none'"
+        }
     )
 
 # Mood Routes
+def mood_response_dict(mood: dict) -> dict:
+    """Build a MoodResponse-shaped dict straight from a humor_diario document"""
+    return {
+        "id": mood["id"],
+        "mood_level": mood["mood_level"],
+        "mood_emoji": mood["mood_emoji"],
+        "description": mood.get("description"),
+        "date": mood["date"]
+    }
+
 @api_router.post("/mood", response_model=MoodResponse)
 async def create_mood_entry(mood_data: MoodCreate, current_user: User = Depends(get_current_user)):
-    # Check if user already has a mood entry for today
-    today = datetime.utcnow().date()
-    existing_mood = await db.humor_diario.find_one({
-        "user_id": current_user.id,
-        "date": {
-            "$gte": datetime.combine(today, datetime.min.time()),
-            "$lt": datetime.combine(today + timedelta(days=1), datetime.min.time())
-        }
-    })
-    
-    if existing_mood:
-        # Update existing mood entry for today
-        mood_dict = {
-            "mood_level": mood_data.mood_level,
-            "mood_emoji": mood_data.mood_emoji,
-            "description": mood_data.description,
-            "date": datetime.utcnow()
-        }
-        
-        await db.humor_diario.update_one(
-            {"_id": existing_mood["_id"]},
-            {"$set": mood_dict}
-        )
-        
-        return MoodResponse(
-            id=existing_mood["id"],
-            mood_level=mood_data.mood_level,
-            mood_emoji=mood_data.mood_emoji,
-            description=mood_data.description,
-            date=mood_dict["date"]
-        )
-    else:
-        # Create new mood entry
-        mood_dict = {
-            "id": str(uuid.uuid4()),
+    # Upsert today's mood entry: update it if it exists, create it otherwise
+    now = datetime.utcnow()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    mood_entry = await db.humor_diario.find_one_and_update(
+        {
             "user_id": current_user.id,
-            "mood_level": mood_data.mood_level,
-            "mood_emoji": mood_data.mood_emoji,
-            "description": mood_data.description,
-            "date": datetime.utcnow()
-        }
-        
-        mood_entry = MoodEntry(**mood_dict)
-        await db.humor_diario.insert_one(mood_entry.dict())
-        
-        return MoodResponse(
-            id=mood_entry.id,
-            mood_level=mood_entry.mood_level,
-            mood_emoji=mood_entry.mood_emoji,
-            description=mood_entry.description,
-            date=mood_entry.date
-        )
+            "date": {
+                "$gte": today_start,
+                "$lt": today_start + timedelta(days=1)
+            }
+        },
+        {
+            "$set": {
+                "mood_level": mood_data.mood_level,
+                "mood_emoji": mood_data.mood_emoji,
+                "description": mood_data.description,
+                "date": now
+            },
+            "$setOnInsert": {"id": _new_id()}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    
+    return MoodResponse(
+        id=mood_entry["id"],
+        mood_level=mood_entry["mood_level"],
+        mood_emoji=mood_entry["mood_emoji"],
+        description=mood_entry.get("description"),
+        date=mood_entry["date"]
+    )
 
 @api_router.get("/mood", response_model=List[MoodResponse])
 async def get_mood_history(current_user: User = Depends(get_current_user)):
@@ -450,25 +683,18 @@ async def get_mood_history(current_user: User = Depends(get_current_user)):
         {"user_id": current_user.id}
     ).sort("date", -1).to_list(100)  # Last 100 entries, newest first
     
-    return [
-        MoodResponse(
-            id=mood["id"],
-            mood_level=mood["mood_level"],
-            mood_emoji=mood["mood_emoji"],
-            description=mood.get("description"),
-            date=mood["date"]
-        )
-        for mood in mood_entries
-    ]
+    # Returning the response directly skips re-validating every entry;
+    # response_model is kept for the OpenAPI schema
+    return ORJSONResponse([mood_response_dict(mood) for mood in mood_entries])
 
 @api_router.get("/mood/today", response_model=Optional[MoodResponse])
 async def get_today_mood(current_user: User = Depends(get_current_user)):
-    today = datetime.utcnow().date()
+    today_start = utc_today_start()
     mood_entry = await db.humor_diario.find_one({
         "user_id": current_user.id,
         "date": {
-            "$gte": datetime.combine(today, datetime.min.time()),
-            "$lt": datetime.combine(today + timedelta(days=1), datetime.min.time())
+            "$gte": today_start,
+            "$lt": today_start + timedelta(days=1)
         }
     })
     
@@ -493,16 +719,7 @@ async def get_week_mood(current_user: User = Depends(get_current_user)):
         "date": {"$gte": seven_days_ago}
     }).sort("date", 1).to_list(7)  # Sort ascending (oldest first)
     
-    return [
-        MoodResponse(
-            id=mood["id"],
-            mood_level=mood["mood_level"],
-            mood_emoji=mood["mood_emoji"],
-            description=mood.get("description"),
-            date=mood["date"]
-        )
-        for mood in mood_entries
-    ]
+    return ORJSONResponse([mood_response_dict(mood) for mood in mood_entries])
 
 # Helper functions for gamification (Estrelas ⭐)
 def calculate_level_from_xp(xp: int) -> int:
@@ -517,57 +734,61 @@ def get_xp_for_next_level(current_level: int) -> int:
     """Get Stars required for next level"""
     return current_level * 100
 
-def get_level_info(level: int) -> dict:
+# Níveis (limite superior inclusivo, info); o último vale para todos os níveis acima
+_LEVEL_TIERS = (
+    (2, MappingProxyType({
+        "name": "Semeador",
+        "emoji": "🌱",
+        "description": "Plantando as primeiras sementes do autocuidado",
+        "tier": "iniciante"
+    })),
+    (5, MappingProxyType({
+        "name": "Cultivador",
+        "emoji": "🌿",
+        "description": "Nutrindo seus hábitos de bem-estar",
+        "tier": "crescimento"
+    })),
+    (8, MappingProxyType({
+        "name": "Florescente",
+        "emoji": "🌸",
+        "description": "Vendo os frutos do seu esforço",
+        "tier": "florescimento"
+    })),
+    (12, MappingProxyType({
+        "name": "Enraizado",
+        "emoji": "🌳",
+        "description": "Forte e equilibrado emocionalmente",
+        "tier": "estabilidade"
+    })),
+    (16, MappingProxyType({
+        "name": "Transformado",
+        "emoji": "🦋",
+        "description": "Evoluído e resiliente",
+        "tier": "transformação"
+    })),
+    (20, MappingProxyType({
+        "name": "Iluminado",
+        "emoji": "✨",
+        "description": "Mestre do autocuidado",
+        "tier": "maestria"
+    })),
+    (21, MappingProxyType({
+        "name": "Guardião",
+        "emoji": "🌟",
+        "description": "Inspirando outros na jornada",
+        "tier": "lendário"
+    })),
+)
+
+# Info indexada diretamente pelo nível (0..21)
+_LEVEL_INFO = tuple(
+    next(info for threshold, info in _LEVEL_TIERS if level <= threshold)
+    for level in range(_LEVEL_TIERS[-1][0] + 1)
+)
+
+def get_level_info(level: int) -> MappingProxyType:
     """Get level name, emoji and description based on current level"""
-    if level <= 2:
-        return {
-            "name": "Semeador",
-            "emoji": "🌱",
-            "description": "Plantando as primeiras sementes do autocuidado",
-            "tier": "iniciante"
-        }
-    elif level <= 5:
-        return {
-            "name": "Cultivador",
-            "emoji": "🌿",
-            "description": "Nutrindo seus hábitos de bem-estar",
-            "tier": "crescimento"
-        }
-    elif level <= 8:
-        return {
-            "name": "Florescente",
-            "emoji": "🌸",
-            "description": "Vendo os frutos do seu esforço",
-            "tier": "florescimento"
-        }
-    elif level <= 12:
-        return {
-            "name": "Enraizado",
-            "emoji": "🌳",
-            "description": "Forte e equilibrado emocionalmente",
-            "tier": "estabilidade"
-        }
-    elif level <= 16:
-        return {
-            "name": "Transformado",
-            "emoji": "🦋",
-            "description": "Evoluído e resiliente",
-            "tier": "transformação"
-        }
-    elif level <= 20:
-        return {
-            "name": "Iluminado",
-            "emoji": "✨",
-            "description": "Mestre do autocuidado",
-            "tier": "maestria"
-        }
-    else:
-        return {
-            "name": "Guardião",
-            "emoji": "🌟",
-            "description": "Inspirando outros na jornada",
-            "tier": "lendário"
-        }
+    return _LEVEL_INFO[max(0, min(level, len(_LEVEL_INFO) - 1))]
 
 # Mission Routes
 @api_router.get("/missions/today")
@@ -577,35 +798,44 @@ async def get_daily_missions(current_user: User = Depends(get_current_user)):
     # Check subscription status first
     
     # Initialize mission database if needed
-    await initialize_mission_database()
+    if not MISSIONS_BY_ID:
+        await initialize_mission_database()
     
     # Get user level for mission selection
-    user_stats = await db.user_stats.find_one({"user_id": current_user.id})
+    user_stats = await db.user_stats.find_one({"user_id": current_user.id}, {"_id": 0, "current_level": 1})
     user_level = user_stats.get("current_level", 1) if user_stats else 1
     
     # Get today's missions (dynamic selection)
     missions = await get_daily_missions_for_user(current_user.id, user_level)
     
-    # Calculate total XP earned today
-    total_xp_today = sum(mission.get("xp_reward", 0) for mission in missions if mission.get("completed", False))
-    possible_xp = sum(mission.get("xp_reward", 0) for mission in missions)
+    # Calculate total XP earned today and possible XP in a single pass
+    total_xp_today = 0
+    possible_xp = 0
+    for mission in missions:
+        xp_reward = mission.get("xp_reward", 0)
+        possible_xp += xp_reward
+        if mission.get("completed", False):
+            total_xp_today += xp_reward
     
-    return {
+    # Plain dicts from the in-memory catalog; hand them straight to orjson
+    return ORJSONResponse({
         "date": datetime.utcnow().date().isoformat(),
         "missions": missions,
         "total_xp_today": total_xp_today,
         "possible_xp": possible_xp,
         "user_level": user_level
-    }
+    })
 
 @api_router.post("/missions/complete")
 async def complete_mission(request: MissionCompleteRequest, current_user: User = Depends(get_current_user)):
     """Complete a daily mission and earn XP"""
-    today = datetime.utcnow().date()
-    today_start = datetime.combine(today, datetime.min.time())
+    now = datetime.utcnow()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
     # Check if mission exists and is valid for today
-    mission = await db.missions.find_one({"id": request.mission_id})
+    if not MISSIONS_BY_ID:
+        await initialize_mission_database()
+    mission = MISSIONS_BY_ID.get(request.mission_id)
     if not mission:
         raise HTTPException(status_code=404, detail="Mission not found")
     
@@ -621,14 +851,14 @@ async def complete_mission(request: MissionCompleteRequest, current_user: User =
         raise HTTPException(status_code=400, detail="Mission already completed today")
     
     # Create or update mission progress
-    progress_id = str(uuid.uuid4())
-    progress_data = UserMissionProgress(
+    progress_id = _new_id()
+    progress_data = UserMissionProgressRecord(
         id=progress_id,
         user_id=current_user.id,
         mission_id=request.mission_id,
-        date=datetime.utcnow(),
+        date=now,
         completed=True,
-        completed_at=datetime.utcnow(),
+        completed_at=now,
         xp_earned=mission["xp_reward"]
     )
     
@@ -640,19 +870,22 @@ async def complete_mission(request: MissionCompleteRequest, current_user: User =
     })
     
     # Insert new completed progress
-    await db.user_mission_progress.insert_one(progress_data.dict())
+    await db.user_mission_progress.insert_one(asdict(progress_data))
     
     # Update user XP
-    await update_user_stats(current_user.id, mission["xp_reward"])
+    await update_user_stats(current_user.id, mission["xp_reward"], now)
     
-    # Calculate total XP earned today
-    today_progress = await db.user_mission_progress.find({
-        "user_id": current_user.id,
-        "date": {"$gte": today_start},
-        "completed": True
-    }).to_list(100)
+    # Calculate total XP earned today (summed server-side)
+    today_totals = await db.user_mission_progress.aggregate([
+        {"$match": {
+            "user_id": current_user.id,
+            "date": {"$gte": today_start},
+            "completed": True
+        }},
+        {"$group": {"_id": None, "total": {"$sum": "$xp_earned"}}}
+    ]).to_list(1)
     
-    total_xp_today = sum(p["xp_earned"] for p in today_progress)
+    total_xp_today = today_totals[0]["total"] if today_totals else 0
     
     return {
         "success": True,
@@ -665,22 +898,26 @@ async def complete_mission(request: MissionCompleteRequest, current_user: User =
 @api_router.get("/user/stats", response_model=UserStatsResponse)
 async def get_user_stats(current_user: User = Depends(get_current_user)):
     # Find or create user stats
-    user_stats = await db.user_stats.find_one({"user_id": current_user.id})
+    user_stats = await db.user_stats.find_one({"user_id": current_user.id}, {"_id": 0, "total_xp": 1})
     
     if not user_stats:
-        # Create initial stats
+        # Create initial stats; an upsert so a concurrent first XP award can't collide
+        now = datetime.utcnow()
         stats_dict = {
-            "id": str(uuid.uuid4()),
-            "user_id": current_user.id,
+            "id": _new_id(),
             "total_xp": 0,
             "current_level": 1,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
         
-        user_stats_obj = UserStats(**stats_dict)
-        await db.user_stats.insert_one(user_stats_obj.dict())
-        user_stats = user_stats_obj.dict()
+        user_stats = await db.user_stats.find_one_and_update(
+            {"user_id": current_user.id},
+            {"$setOnInsert": stats_dict},
+            {"_id": 0, "total_xp": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
     
     current_level = calculate_level_from_xp(user_stats["total_xp"])
     xp_for_next = get_xp_for_next_level(current_level)
@@ -701,76 +938,114 @@ async def get_user_stats(current_user: User = Depends(get_current_user)):
         level_tier=level_info["tier"]
     )
 
-async def update_user_stats(user_id: str, xp_to_add: int):
+async def update_user_stats(user_id: str, xp_to_add: int, now: Optional[datetime] = None):
     """Update user stats with new XP"""
-    user_stats = await db.user_stats.find_one({"user_id": user_id})
+    now = now or datetime.utcnow()
+    # Atomic increment (creates the stats document on first XP)
+    user_stats = await db.user_stats.find_one_and_update(
+        {"user_id": user_id},
+        {
+            "$inc": {"total_xp": xp_to_add},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"id": _new_id(), "current_level": 1, "created_at": now}
+        },
+        {"_id": 0, "total_xp": 1, "current_level": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
     
-    if not user_stats:
-        # Create initial stats
-        stats_dict = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "total_xp": xp_to_add,
-            "current_level": calculate_level_from_xp(xp_to_add),
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        user_stats_obj = UserStats(**stats_dict)
-        await db.user_stats.insert_one(user_stats_obj.dict())
-    else:
-        # Update existing stats
-        new_xp = user_stats["total_xp"] + xp_to_add
-        new_level = calculate_level_from_xp(new_xp)
-        
+    # XP only grows, so $max keeps the level right even with concurrent updates
+    new_level = calculate_level_from_xp(user_stats["total_xp"])
+    if new_level > user_stats.get("current_level", 1):
         await db.user_stats.update_one(
-            {"_id": user_stats["_id"]},
-            {"$set": {
-                "total_xp": new_xp,
-                "current_level": new_level,
-                "updated_at": datetime.utcnow()
-            }}
+            {"user_id": user_id},
+            {"$max": {"current_level": new_level}}
         )
 
 # Original routes
+_ROOT_BODY = orjson.dumps({"message": "Mental Health App API"})
+
 @api_router.get("/")
 async def root():
-    return {"message": "Mental Health App API"}
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate, current_user: User = Depends(get_current_user)):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    status_obj = StatusCheck(client_name=input.client_name)
+    _ = await db.status_checks.insert_one(status_obj.model_dump())
     return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks(current_user: User = Depends(get_current_user)):
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+@api_router.get("/status", response_model=StatusCheckPage)
+async def get_status_checks(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # Keyset pagination on _id, newest first
+    query = {}
+    if cursor:
+        try:
+            query["_id"] = {"$lt": ObjectId(cursor)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    status_checks = await db.status_checks.find(query).sort("_id", -1).limit(limit).to_list(limit)
+    next_cursor = str(status_checks[-1]["_id"]) if len(status_checks) == limit else None
+    for status_check in status_checks:
+        del status_check["_id"]
+    
+    return ORJSONResponse({"items": status_checks, "next_cursor": next_cursor})
 
 # Subscription Management APIs
+# Corpo JSON já codificado da lista de planos (planos quase nunca mudam)
+_plans_body_cache = TTLCache(maxsize=1, ttl=300)
+# Planos ativos por id, usados no checkout e na ativação de assinaturas
+_plan_cache = TTLCache(maxsize=32, ttl=300)
+
+async def get_active_plan(plan_id: str) -> Optional[dict]:
+    """Get an active subscription plan, served from a short-lived in-process cache"""
+    plan = _plan_cache.get(plan_id)
+    if plan is None:
+        plan = await db.subscription_plans.find_one({"id": plan_id, "is_active": True})
+        if plan:
+            _plan_cache[plan_id] = plan
+    return plan
+
 @api_router.get("/subscription/plans")
 async def get_subscription_plans():
     """Get all available subscription plans"""
     try:
-        # Initialize default plans if none exist
-        await initialize_default_plans()
-        
-        cursor = db.subscription_plans.find({"is_active": True}, {"_id": 0})  # Exclude _id field
-        plans = await cursor.to_list(length=None)
-        return {"plans": plans}
+        body = _plans_body_cache.get("plans")
+        if body is None:
+            # Initialize default plans if none exist
+            await initialize_default_plans()
+            
+            cursor = db.subscription_plans.find({"is_active": True}, {"_id": 0})  # Exclude _id field
+            plans = await cursor.to_list(length=None)
+            body = _plans_body_cache["plans"] = orjson.dumps({"plans": plans})
+        return Response(content=body, media_type="application/json")
     except Exception as e:
-        logger.error(f"Error getting plans: {e}")
+        logger.error("Error getting plans: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get subscription plans")
 
 @api_router.get("/subscription/status")
 async def get_subscription_status(current_user: User = Depends(get_current_user)):
     """Get user's current subscription status"""
     try:
-        logger.info(f"Fetching subscription for user_id: {current_user.id}")
-        subscription_data = await db.user_subscriptions.find_one({"user_id": current_user.id})
-        logger.info(f"Subscription data found: {subscription_data}")
+        logger.info("Fetching subscription for user_id: %s", current_user.id)
+        # Fetch the subscription together with its plan in one round-trip
+        subscriptions = await db.user_subscriptions.aggregate([
+            {"$match": {"user_id": current_user.id}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": "subscription_plans",
+                "localField": "plan_id",
+                "foreignField": "id",
+                "as": "plans"
+            }}
+        ]).to_list(1)
+        subscription_data = subscriptions[0] if subscriptions else None
+        logger.info("Subscription data found: %s", subscription_data)
         
         if not subscription_data:
             return {
@@ -781,44 +1056,48 @@ async def get_subscription_status(current_user: User = Depends(get_current_user)
                 "plan_name": None
             }
         
-        subscription = UserSubscription(**subscription_data)
+        # Read the few fields needed straight from the document
+        subscription_status = subscription_data["status"]
         now = datetime.utcnow()
         
-        if subscription.status == SubscriptionStatus.FREE_TRIAL:
-            time_remaining = subscription.free_trial_end - now
+        if subscription_status == SubscriptionStatus.FREE_TRIAL:
+            free_trial_end = subscription_data["free_trial_end"]
+            time_remaining = free_trial_end - now
             hours_remaining = time_remaining.total_seconds() / 3600
             days_remaining = int(hours_remaining / 24) + (1 if hours_remaining % 24 > 0 else 0)  # Round up
             return {
-                "has_subscription": subscription.free_trial_end > now,
+                "has_subscription": free_trial_end > now,
                 "status": "free_trial",
                 "days_remaining": max(1, days_remaining),  # At least 1 day if still active
                 "is_trial": True,
                 "plan_name": "Período Gratuito",
-                "end_date": subscription.free_trial_end.isoformat()
+                "end_date": free_trial_end.isoformat()
             }
         
-        if subscription.status == SubscriptionStatus.ACTIVE:
-            days_remaining = (subscription.end_date - now).days
-            plan = await db.subscription_plans.find_one({"id": subscription.plan_id})
+        if subscription_status == SubscriptionStatus.ACTIVE:
+            end_date = subscription_data["end_date"]
+            days_remaining = (end_date - now).days
+            plans = subscription_data["plans"]
+            plan = plans[0] if plans else None
             return {
                 "has_subscription": days_remaining > 0,
                 "status": "active",
                 "days_remaining": max(0, days_remaining),
                 "is_trial": False,
                 "plan_name": plan['name'] if plan else "Plano Ativo",
-                "end_date": subscription.end_date.isoformat()
+                "end_date": end_date.isoformat()
             }
         
         return {
             "has_subscription": False,
-            "status": subscription.status,
+            "status": subscription_status,
             "days_remaining": 0,
             "is_trial": False,
             "plan_name": None
         }
         
     except Exception as e:
-        logger.error(f"Error getting subscription status: {e}")
+        logger.error("Error getting subscription status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get subscription status")
 
 @api_router.post("/subscription/checkout")
@@ -826,7 +1105,7 @@ async def create_checkout_session(request: CreateCheckoutRequest, current_user:
     """Create Mercado Pago recurring subscription (preapproval)"""
     try:
         # Get the plan details
-        plan = await db.subscription_plans.find_one({"id": request.plan_id, "is_active": True})
+        plan = await get_active_plan(request.plan_id)
         if not plan:
             raise HTTPException(status_code=404, detail="Plan not found")
         
@@ -856,49 +1135,49 @@ async def create_checkout_session(request: CreateCheckoutRequest, current_user:
             }
         }
         
-        logger.info(f"Creating preapproval for user {current_user.email}: {preapproval_data}")
+        logger.info("Creating preapproval for user %s: %s", current_user.email, preapproval_data)
         
         try:
             preapproval_response = sdk.preapproval().create(preapproval_data)
         except Exception as api_error:
-            logger.error(f"Mercado Pago API error: {api_error}")
+            logger.error("Mercado Pago API error: %s", api_error)
             raise HTTPException(status_code=500, detail=f"Mercado Pago API error: {str(api_error)}")
         
-        logger.info(f"Full preapproval response: {preapproval_response}")
+        logger.info("Full preapproval response: %s", preapproval_response)
         
         # Check for errors in response
         if "status" in preapproval_response:
             status_code = preapproval_response.get("status")
             if status_code != 200 and status_code != 201:
                 error_message = preapproval_response.get("response", {}).get("message", "Unknown error")
-                logger.error(f"Mercado Pago error (status {status_code}): {error_message}")
+                logger.error("Mercado Pago error (status %s): %s", status_code, error_message)
                 raise HTTPException(status_code=500, detail=f"Mercado Pago error: {error_message}")
         
         # Check response structure
         if "response" not in preapproval_response:
-            logger.error(f"Unexpected response structure: {preapproval_response}")
+            logger.error("Unexpected response structure: %s", preapproval_response)
             raise HTTPException(status_code=500, detail="Invalid Mercado Pago response structure")
         
         preapproval = preapproval_response["response"]
         
-        logger.info(f"Preapproval object: {preapproval}")
+        logger.info("Preapproval object: %s", preapproval)
         
         # Get preapproval ID
         preapproval_id = preapproval.get('id')
         if not preapproval_id:
-            logger.error(f"Preapproval ID is None. Full preapproval object: {preapproval}")
-            logger.error(f"Response keys: {list(preapproval.keys())}")
+            logger.error("Preapproval ID is None. Full preapproval object: %s", preapproval)
+            logger.error("Response keys: %s", list(preapproval.keys()))
             raise HTTPException(status_code=500, detail="Failed to get preapproval ID from Mercado Pago")
         
-        logger.info(f"Preapproval created: {preapproval_id}")
+        logger.info("Preapproval created: %s", preapproval_id)
         
         # Get init_point (checkout URL) - try sandbox_init_point first for testing
         checkout_url = preapproval.get('sandbox_init_point') or preapproval.get('init_point')
         if not checkout_url:
-            logger.error(f"No init_point found. Available keys: {list(preapproval.keys())}")
+            logger.error("No init_point found. Available keys: %s", list(preapproval.keys()))
             raise HTTPException(status_code=500, detail="Failed to get checkout URL from Mercado Pago")
         
-        logger.info(f"Checkout URL: {checkout_url}")
+        logger.info("Checkout URL: %s", checkout_url)
         
         # Create payment transaction record
         transaction = PaymentTransaction(
@@ -917,14 +1196,14 @@ async def create_checkout_session(request: CreateCheckoutRequest, current_user:
             }
         )
         
-        await db.payment_transactions.insert_one(transaction.dict())
+        await db.payment_transactions.insert_one(transaction.model_dump(exclude_none=True))
         
         return {"checkout_url": checkout_url, "session_id": preapproval_id}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating checkout session: {e}")
+        logger.error("Error creating checkout session: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create checkout session")
 
 @api_router.get("/subscription/checkout/status/{session_id}")
@@ -948,21 +1227,11 @@ async def get_checkout_status(session_id: str, current_user: User = Depends(get_
         
         # If payment is completed but transaction is still pending, process it
         if payment_status == "paid" and transaction.get("subscription_activated") != True:
-            logger.info(f"Processing completed payment for preference {session_id}")
+            logger.info("Processing completed payment for preference %s", session_id)
             
-            # Activate subscription
-            success = await activate_subscription(transaction['user_id'], transaction['plan_id'])
-            if success:
-                logger.info(f"Subscription activated for user {transaction['user_id']}")
-                await db.payment_transactions.update_one(
-                    {"stripe_session_id": session_id},
-                    {"$set": {
-                        "subscription_activated": True,
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
-            else:
-                logger.error(f"Failed to activate subscription for user {transaction['user_id']}")
+            # Only the request that wins the claim activates the subscription
+            if await claim_subscription_activation(session_id):
+                await activate_claimed_subscription(session_id, transaction)
         
         return {
             "status": "active" if payment_status == "paid" else "pending",
@@ -972,12 +1241,63 @@ async def get_checkout_status(session_id: str, current_user: User = Depends(get_
         }
         
     except Exception as e:
-        logger.error(f"Error getting checkout status: {e}")
+        logger.error("Error getting checkout status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get checkout status")
 
+async def claim_subscription_activation(session_id: str) -> Optional[dict]:
+    """Atomically mark a transaction as paid and activated; only the first caller gets it back"""
+    return await db.payment_transactions.find_one_and_update(
+        {"stripe_session_id": session_id, "subscription_activated": {"$ne": True}},
+        {"$set": {
+            "payment_status": "paid",
+            "subscription_activated": True,
+            "updated_at": datetime.utcnow()
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def activate_claimed_subscription(session_id: str, transaction: dict):
+    """Activate the subscription for a claimed transaction, releasing the claim on failure"""
+    success = await activate_subscription(transaction['user_id'], transaction['plan_id'])
+    if success:
+        logger.info("Subscription activated for user %s", transaction['user_id'])
+    else:
+        logger.error("Failed to activate subscription for user %s", transaction['user_id'])
+        await db.payment_transactions.update_one(
+            {"stripe_session_id": session_id},
+            {"$set": {"subscription_activated": False}}
+        )
+
+async def claim_webhook_event(provider: str, event_id) -> bool:
+    """Record a webhook delivery; False if this event was already processed"""
+    try:
+        await db.webhook_events.insert_one({
+            "provider": provider,
+            "event_id": str(event_id),
+            "received_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def release_webhook_event(provider: str, event_id):
+    """Forget a delivery whose processing failed so the provider's retry is handled"""
+    await db.webhook_events.delete_one({"provider": provider, "event_id": str(event_id)})
+
+def fetch_mercadopago_resource(resource, resource_id):
+    """Look up a notified preapproval/payment on Mercado Pago; None if it doesn't exist there"""
+    result = resource.get(resource_id)
+    status_code = result.get("status")
+    if status_code == 404:
+        return None
+    if status_code != 200:
+        raise RuntimeError(f"Mercado Pago lookup of {resource_id} failed with status {status_code}")
+    return result["response"]
+
 @api_router.post("/webhook/mercadopago")
 async def mercadopago_webhook(request: Request):
     """Handle Mercado Pago webhooks"""
+    event_id = None
     try:
         body = await request.body()
         
@@ -991,7 +1311,7 @@ async def mercadopago_webhook(request: Request):
             logger.error("Invalid payload in webhook")
             raise HTTPException(status_code=400, detail="Invalid payload")
         
-        logger.info(f"Received Mercado Pago webhook: {data}")
+        logger.info("Received Mercado Pago webhook: %s", data)
         
         # Handle preapproval notifications (recurring subscriptions)
         if data.get('type') == 'subscription_preapproval' or data.get('action') == 'payment.updated':
@@ -1000,8 +1320,17 @@ async def mercadopago_webhook(request: Request):
             if preapproval_id:
                 # Get preapproval details from Mercado Pago
                 try:
-                    preapproval_info = sdk.preapproval().get(preapproval_id)
-                    preapproval = preapproval_info["response"]
+                    preapproval = fetch_mercadopago_resource(sdk.preapproval(), preapproval_id)
+                    if preapproval is None:
+                        logger.info("Unknown preapproval %s in notification ignored", preapproval_id)
+                        return {"status": "ignored"}
+                    
+                    # Claim only once Mercado Pago confirmed the resource; redeliveries of a
+                    # state that was already applied are acknowledged without reprocessing
+                    event_id = f"preapproval:{preapproval_id}:{preapproval.get('status')}"
+                    if not await claim_webhook_event("mercadopago", event_id):
+                        logger.info("Duplicate Mercado Pago notification %s ignored", event_id)
+                        return {"status": "duplicate"}
                     
                     # Find the transaction using preapproval_id
                     transaction = await db.payment_transactions.find_one({
@@ -1013,17 +1342,9 @@ async def mercadopago_webhook(request: Request):
                         
                         # Update transaction based on preapproval status
                         if preapproval_status == 'authorized':
-                            await db.payment_transactions.update_one(
-                                {"stripe_session_id": preapproval_id},
-                                {"$set": {
-                                    "payment_status": "paid",
-                                    "updated_at": datetime.utcnow()
-                                }}
-                            )
-                            
-                            # Activate subscription
-                            await activate_subscription(transaction['user_id'], transaction['plan_id'])
-                            logger.info(f"Subscription activated for user {transaction['user_id']} via preapproval")
+                            # Atomically move to paid; a concurrent status poll can't activate twice
+                            if await claim_subscription_activation(preapproval_id):
+                                await activate_claimed_subscription(preapproval_id, transaction)
                         
                         elif preapproval_status in ['pending', 'paused']:
                             await db.payment_transactions.update_one(
@@ -1044,15 +1365,26 @@ async def mercadopago_webhook(request: Request):
                             )
                             
                 except Exception as e:
-                    logger.error(f"Error processing preapproval webhook: {e}")
+                    logger.error("Error processing preapproval webhook: %s", e)
+                    if event_id is not None:
+                        await release_webhook_event("mercadopago", event_id)
+                    # A 200 would stop Mercado Pago from retrying the released delivery
+                    raise HTTPException(status_code=500, detail="Webhook processing failed")
         
         # Handle regular payment notifications (for recurring charges)
         elif data.get('type') == 'payment':
             payment_id = data['data']['id']
             
             # Get payment details from Mercado Pago
-            payment_info = sdk.payment().get(payment_id)
-            payment = payment_info["response"]
+            payment = fetch_mercadopago_resource(sdk.payment(), payment_id)
+            if payment is None:
+                logger.info("Unknown payment %s in notification ignored", payment_id)
+                return {"status": "ignored"}
+            
+            event_id = f"payment:{payment_id}:{payment.get('status')}"
+            if not await claim_webhook_event("mercadopago", event_id):
+                logger.info("Duplicate Mercado Pago notification %s ignored", event_id)
+                return {"status": "duplicate"}
             
             # Check if this is a preapproval payment
             preapproval_id = payment.get('preapproval_id')
@@ -1066,7 +1398,7 @@ async def mercadopago_webhook(request: Request):
                 if transaction and payment['status'] == 'approved':
                     # Extend subscription for another period
                     await activate_subscription(transaction['user_id'], transaction['plan_id'])
-                    logger.info(f"Subscription renewed for user {transaction['user_id']} via recurring payment")
+                    logger.info("Subscription renewed for user %s via recurring payment", transaction['user_id'])
             else:
                 # Regular one-time payment (legacy)
                 preference_id = payment.get('external_reference') or payment.get('metadata', {}).get('preference_id')
@@ -1085,27 +1417,37 @@ async def mercadopago_webhook(request: Request):
                     else:
                         status = "failed"
                     
-                    await db.payment_transactions.update_one(
-                        {"stripe_session_id": preference_id},
-                        {"$set": {
-                            "payment_status": status,
-                            "updated_at": datetime.utcnow()
-                        }}
-                    )
-                    
                     if status == "paid":
-                        await activate_subscription(transaction['user_id'], transaction['plan_id'])
-                        logger.info(f"Subscription activated for user {transaction['user_id']}")
+                        if await claim_subscription_activation(preference_id):
+                            await activate_claimed_subscription(preference_id, transaction)
+                    else:
+                        await db.payment_transactions.update_one(
+                            {"stripe_session_id": preference_id},
+                            {"$set": {
+                                "payment_status": status,
+                                "updated_at": datetime.utcnow()
+                            }}
+                        )
         
         return {"status": "success"}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error handling Stripe webhook: {e}")
+        logger.error("Error handling Mercado Pago webhook: %s", e)
+        if event_id is not None:
+            await release_webhook_event("mercadopago", event_id)
         raise HTTPException(status_code=500, detail="Webhook processing failed")
 
 # Subscription helper functions
+_default_plans_initialized = False
+
 async def initialize_default_plans():
     """Initialize default subscription plans"""
+    global _default_plans_initialized
+    if _default_plans_initialized:
+        return
+    
     plans = [
         {
             "id": "monthly",
@@ -1158,19 +1500,18 @@ async def initialize_default_plans():
         }
     ]
     
-    for plan in plans:
-        existing = await db.subscription_plans.find_one({"id": plan["id"]})
-        if not existing:
-            await db.subscription_plans.insert_one(plan)
-            logger.info(f"Created plan: {plan['name']}")
+    # Insert missing plans in one round-trip; existing ones are left untouched
+    result = await db.subscription_plans.bulk_write(
+        [UpdateOne({"id": plan["id"]}, {"$setOnInsert": plan}, upsert=True) for plan in plans],
+        ordered=False
+    )
+    if result.upserted_count:
+        logger.info("Created %s subscription plans", result.upserted_count)
+    _default_plans_initialized = True
 
 async def create_free_trial(user_id: str):
     """Create a 1-day free trial for new user"""
     try:
-        existing = await db.user_subscriptions.find_one({"user_id": user_id})
-        if existing:
-            return  # User already has a subscription
-        
         now = datetime.utcnow()
         trial_end = now + timedelta(days=1)  # Changed to 1 day
         
@@ -1186,17 +1527,23 @@ async def create_free_trial(user_id: str):
             "updated_at": now
         }
         
-        await db.user_subscriptions.insert_one(subscription)
-        logger.info(f"Created 1-day free trial for user: {user_id}")
+        # Insert only if the user has no subscription yet (atomic, one round trip)
+        result = await db.user_subscriptions.update_one(
+            {"user_id": user_id},
+            {"$setOnInsert": subscription},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            logger.info("Created 1-day free trial for user: %s", user_id)
         
     except Exception as e:
-        logger.error(f"Error creating free trial: {e}")
+        logger.error("Error creating free trial: %s", e)
 
 
 async def activate_subscription(user_id: str, plan_id: str):
     """Activate user subscription after successful payment"""
     try:
-        plan = await db.subscription_plans.find_one({"id": plan_id, "is_active": True})
+        plan = await get_active_plan(plan_id)
         if not plan:
             return False
         
@@ -1218,11 +1565,11 @@ async def activate_subscription(user_id: str, plan_id: str):
             upsert=True
         )
         
-        logger.info(f"Activated subscription for user {user_id} with plan {plan_id}")
+        logger.info("Activated subscription for user %s with plan %s", user_id, plan_id)
         return result.modified_count > 0 or result.upserted_id is not None
         
     except Exception as e:
-        logger.error(f"Error activating subscription: {e}")
+        logger.error("Error activating subscription: %s", e)
         return False
 
 # Subscription middleware to check access - DISABLED (all features available)
@@ -1232,57 +1579,94 @@ async def check_subscription_access(current_user: User = Depends(get_current_use
     return None
 
 # Chat endpoints
+# Prompt budget for past turns sent back to OpenAI
+CHAT_HISTORY_MESSAGES = 20
+CHAT_HISTORY_MAX_CHARS = 2000
+
+async def prepare_chat_turn(request: SendMessageRequest, user_id: str):
+    """Resolve the conversation and build the OpenAI message list for a new user message"""
+    # Get or create conversation
+    conversation_id = request.conversation_id
+    if not conversation_id:
+        # Create new conversation
+        conversation_id = _new_id()
+        conversation = ChatConversation(
+            id=conversation_id,
+            user_id=user_id,
+            title=request.message[:50] + "..." if len(request.message) > 50 else request.message
+        )
+        # A new conversation has no history to load
+        user_context, _ = await asyncio.gather(
+            get_user_context_for_chat(user_id),
+            db.chat_conversations.insert_one(conversation.model_dump())
+        )
+        messages = []
+    else:
+        # Get user context and conversation history concurrently
+        user_context, messages = await asyncio.gather(
+            get_user_context_for_chat(user_id),
+            db.chat_messages.find(
+                {"conversation_id": conversation_id, "user_id": user_id},
+                {"_id": 0, "role": 1, "content": 1}
+            ).sort([("timestamp", -1), ("_id", -1)]).limit(CHAT_HISTORY_MESSAGES).to_list(CHAT_HISTORY_MESSAGES)
+        )
+        # Most recent turns were fetched newest-first (_id breaks the tie between a
+        # user message and its reply saved in the same millisecond); the prompt needs them in order
+        messages.reverse()
+    
+    # Create system message with therapist persona and user context
+    system_message = create_therapist_system_message(user_context)
+    
+    # Build conversation history for OpenAI
+    chat_history = [{"role": "system", "content": system_message}]
+    for msg in messages:
+        chat_history.append({
+            "role": "user" if msg["role"] == "user" else "assistant",
+            "content": msg["content"][:CHAT_HISTORY_MAX_CHARS]
+        })
+    
+    # Add current message
+    chat_history.append({"role": "user", "content": request.message})
+    
+    return conversation_id, user_context, chat_history
+
+async def save_chat_turn(conversation_id: str, user_id: str, user_message: str, user_context: dict, ai_response: str) -> str:
+    """Persist the user message and AI reply and bump the conversation; returns the AI message id"""
+    user_message_obj = ChatMessageRecord(
+        id=_new_id(),
+        conversation_id=conversation_id,
+        user_id=user_id,
+        role=MessageRole.USER,
+        content=user_message,
+        user_mood_context=user_context.get("mood"),
+        user_missions_context=user_context.get("missions")
+    )
+    
+    ai_msg_id = _new_id()
+    ai_message_obj = ChatMessageRecord(
+        id=ai_msg_id,
+        conversation_id=conversation_id,
+        user_id=user_id,
+        role=MessageRole.ASSISTANT,
+        content=ai_response
+    )
+    
+    # Store both messages and bump the conversation in parallel
+    await asyncio.gather(
+        db.chat_messages.insert_many([user_message_obj.to_document(), ai_message_obj.to_document()]),
+        db.chat_conversations.update_one(
+            {"id": conversation_id, "user_id": user_id},
+            {"$inc": {"message_count": 2}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+    )
+    return ai_msg_id
+
 @api_router.post("/chat/send", response_model=ChatResponse)
 async def send_chat_message(request: SendMessageRequest, current_user: User = Depends(get_current_user)):
     """Send a message to the therapist chat"""
     try:
-        # Get or create conversation
-        conversation_id = request.conversation_id
-        if not conversation_id:
-            # Create new conversation
-            conversation_id = str(uuid.uuid4())
-            conversation = ChatConversation(
-                id=conversation_id,
-                user_id=current_user.id,
-                title=request.message[:50] + "..." if len(request.message) > 50 else request.message
-            )
-            await db.chat_conversations.insert_one(conversation.dict())
-        else:
-            # Update existing conversation
-            await db.chat_conversations.update_one(
-                {"id": conversation_id, "user_id": current_user.id},
-                {"$set": {"updated_at": datetime.utcnow()}}
-            )
-
-        # Get user context for personalized responses
-        user_context = await get_user_context_for_chat(current_user.id)
-        
-        # Create system message with therapist persona and user context
-        system_message = create_therapist_system_message(user_context)
-        
-        # Initialize OpenAI chat
-        OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
-        if not OPENAI_API_KEY:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-            
-        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-        
-        # Load conversation history
-        messages = await db.chat_messages.find({
-            "conversation_id": conversation_id,
-            "user_id": current_user.id
-        }).sort("timestamp", 1).limit(20).to_list(20)
-        
-        # Build conversation history for OpenAI
-        chat_history = [{"role": "system", "content": system_message}]
-        for msg in messages:
-            chat_history.append({
-                "role": "user" if msg["role"] == "user" else "assistant",
-                "content": msg["content"]
-            })
-        
-        # Add current message
-        chat_history.append({"role": "user", "content": request.message})
+        client = get_openai_client()
+        conversation_id, user_context, chat_history = await prepare_chat_turn(request, current_user.id)
         
         # Send message to OpenAI
         response = await client.chat.completions.create(
@@ -1293,36 +1677,7 @@ async def send_chat_message(request: SendMessageRequest, current_user: User = De
         )
         
         ai_response = response.choices[0].message.content
-        
-        # Save user message
-        user_msg_id = str(uuid.uuid4())
-        user_message_obj = ChatMessage(
-            id=user_msg_id,
-            conversation_id=conversation_id,
-            user_id=current_user.id,
-            role=MessageRole.USER,
-            content=request.message,
-            user_mood_context=user_context.get("mood"),
-            user_missions_context=user_context.get("missions")
-        )
-        await db.chat_messages.insert_one(user_message_obj.dict())
-        
-        # Save AI response
-        ai_msg_id = str(uuid.uuid4())
-        ai_message_obj = ChatMessage(
-            id=ai_msg_id,
-            conversation_id=conversation_id,
-            user_id=current_user.id,
-            role=MessageRole.ASSISTANT,
-            content=ai_response
-        )
-        await db.chat_messages.insert_one(ai_message_obj.dict())
-        
-        # Update conversation message count
-        await db.chat_conversations.update_one(
-            {"id": conversation_id},
-            {"$inc": {"message_count": 2}}
-        )
+        ai_msg_id = await save_chat_turn(conversation_id, current_user.id, request.message, user_context, ai_response)
         
         return ChatResponse(
             message=ai_response,
@@ -1332,83 +1687,135 @@ async def send_chat_message(request: SendMessageRequest, current_user: User = De
         )
         
     except Exception as e:
-        logger.error(f"Error in chat: {e}")
+        logger.error("Error in chat: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao processar mensagem")
 
+def _sse(payload: dict) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+@api_router.post("/chat/send/stream")
+async def stream_chat_message(request: SendMessageRequest, current_user: User = Depends(get_current_user)):
+    """Send a message to the therapist chat, streaming the reply as Server-Sent Events"""
+    try:
+        client = get_openai_client()
+        conversation_id, user_context, chat_history = await prepare_chat_turn(request, current_user.id)
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=chat_history,
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        )
+    except Exception as e:
+        logger.error("Error in chat: %s", e)
+        raise HTTPException(status_code=500, detail="Erro ao processar mensagem")
+    
+    async def events():
+        yield _sse({"conversation_id": conversation_id})
+        chunks = []
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield _sse({"delta": delta})
+            ai_response = "".join(chunks)
+            # Persist only once the full reply is known
+            ai_msg_id = await save_chat_turn(conversation_id, current_user.id, request.message, user_context, ai_response)
+        except Exception as e:
+            logger.error("Error in chat stream: %s", e)
+            yield _sse({"error": "Erro ao processar mensagem"})
+            return
+        yield _sse({
+            "done": True,
+            "conversation_id": conversation_id,
+            "message_id": ai_msg_id,
+            "timestamp": datetime.utcnow()
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/chat/conversations")
 async def get_user_conversations(current_user: User = Depends(get_current_user)):
     """Get user's chat conversations"""
-    conversations = await db.chat_conversations.find({
-        "user_id": current_user.id
-    }).sort("updated_at", -1).to_list(50)
+    # Only the fields the conversation list shows; (user_id, updated_at) index serves the sort
+    conversations = await db.chat_conversations.find(
+        {"user_id": current_user.id},
+        {"_id": 0, "id": 1, "title": 1, "created_at": 1, "updated_at": 1, "message_count": 1}
+    ).sort("updated_at", -1).to_list(50)
     
-    # Convert ObjectId to string for JSON serialization
-    for conv in conversations:
-        if "_id" in conv:
-            conv["_id"] = str(conv["_id"])
-    
-    return {"conversations": conversations}
+    return ORJSONResponse({"conversations": conversations})
 
 @api_router.get("/chat/conversation/{conversation_id}/messages")
 async def get_conversation_messages(conversation_id: str, current_user: User = Depends(get_current_user)):
     """Get messages from a specific conversation"""
     # Verify conversation belongs to user
-    conversation = await db.chat_conversations.find_one({
-        "id": conversation_id,
-        "user_id": current_user.id
-    })
+    conversation = await db.chat_conversations.find_one(
+        {"id": conversation_id, "user_id": current_user.id},
+        {"_id": 0}
+    )
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    messages = await db.chat_messages.find({
-        "conversation_id": conversation_id,
-        "user_id": current_user.id
-    }).sort("timestamp", 1).to_list(100)
-    
-    # Convert ObjectId to string for JSON serialization
-    for msg in messages:
-        if "_id" in msg:
-            msg["_id"] = str(msg["_id"])
+    messages = await db.chat_messages.find(
+        {"conversation_id": conversation_id, "user_id": current_user.id},
+        {"_id": 0, "id": 1, "conversation_id": 1, "role": 1, "content": 1, "timestamp": 1}
+    ).sort("timestamp", 1).to_list(100)
     
-    if conversation and "_id" in conversation:
-        conversation["_id"] = str(conversation["_id"])
-    
-    return {"messages": messages, "conversation": conversation}
+    return ORJSONResponse({"messages": messages, "conversation": conversation})
 
 async def get_user_context_for_chat(user_id: str) -> dict:
     """Get user's recent data for chat context"""
     context = {}
+    today_start = utc_today_start()
+    
+    # Recent moods (last 7) summarised server-side, today's completed missions and stats are independent reads
+    mood_summary, completed_missions, user_stats = await asyncio.gather(
+        db.humor_diario.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$sort": {"date": -1}},
+            {"$limit": 7},
+            {"$group": {
+                "_id": None,
+                "latest_mood": {"$first": "$mood_level"},
+                "latest_emoji": {"$first": "$mood_emoji"},
+                "oldest_mood": {"$last": "$mood_level"},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(1),
+        db.user_mission_progress.find(
+            {"user_id": user_id, "date": {"$gte": today_start}, "completed": True},
+            {"_id": 0, "mission_id": 1}
+        ).to_list(10),
+        db.user_stats.find_one({"user_id": user_id}, {"_id": 0, "current_level": 1, "total_xp": 1})
+    )
     
-    # Get recent mood data (last 7 days)
-    recent_moods = await db.moods.find({
-        "user_id": user_id
-    }).sort("date", -1).limit(7).to_list(7)
-    
-    if recent_moods:
+    if mood_summary:
+        moods = mood_summary[0]
         context["mood"] = {
-            "recent_entries": len(recent_moods),
-            "latest_mood": recent_moods[0]["mood_level"] if recent_moods else None,
-            "latest_emoji": recent_moods[0]["mood_emoji"] if recent_moods else None,
-            "trend": "improving" if len(recent_moods) > 1 and recent_moods[0]["mood_level"] > recent_moods[-1]["mood_level"] else "stable"
+            "recent_entries": moods["count"],
+            "latest_mood": moods["latest_mood"],
+            "latest_emoji": moods["latest_emoji"],
+            "trend": "improving" if moods["count"] > 1 and moods["latest_mood"] > moods["oldest_mood"] else "stable"
         }
     
-    # Get mission completion data (today)
-    today = datetime.utcnow().date()
-    completed_missions = await db.user_missions.find({
-        "user_id": user_id,
-        "date": {"$gte": datetime.combine(today, datetime.min.time())},
-        "completed": True
-    }).to_list(10)
-    
     if completed_missions:
         context["missions"] = {
             "completed_today": len(completed_missions),
-            "mission_types": [mission.get("mission_type") for mission in completed_missions]
+            # Progress rows only carry the mission id; the type comes from the catalog
+            "mission_types": [
+                MISSIONS_BY_ID.get(progress["mission_id"], {}).get("category")
+                for progress in completed_missions
+            ]
         }
     
-    # Get user stats
-    user_stats = await db.user_stats.find_one({"user_id": user_id})
     if user_stats:
         context["progress"] = {
             "level": user_stats.get("current_level", 1),
@@ -1417,9 +1824,7 @@ async def get_user_context_for_chat(user_id: str) -> dict:
     
     return context
 
-def create_therapist_system_message(user_context: dict) -> str:
-    """Create personalized therapist system message"""
-    base_message = """Você é Dr. Ana, uma terapeuta experiente e empática especializada em saúde mental e bem-estar. 
+BASE_THERAPIST_MESSAGE = """Você é Dr. Ana, uma terapeuta experiente e empática especializada em saúde mental e bem-estar. 
     
 Sua personalidade:
 - Calorosa, compreensiva e não julgadora
@@ -1438,6 +1843,8 @@ Diretrizes importantes:
 - Use linguagem simples e acessível
 - Termine suas respostas com pergunta reflexiva ou sugestão prática quando apropriado"""
 
+def create_therapist_system_message(user_context: dict) -> str:
+    """Create personalized therapist system message"""
     # Add user context if available
     context_additions = []
     
@@ -1459,433 +1866,457 @@ Diretrizes importantes:
         level = progress_info.get("level", 1)
         context_additions.append(f"O usuário está no nível {level} de progresso no aplicativo.")
     
-    if context_additions:
-        context_text = " ".join(context_additions)
-        base_message += f"\n\nContexto atual do usuário: {context_text} Use essas informações para personalizar sua resposta e mostrar que você está acompanhando o progresso dele."
+    if not context_additions:
+        return BASE_THERAPIST_MESSAGE
     
-    return base_message
+    context_text = " ".join(context_additions)
+    return f"{BASE_THERAPIST_MESSAGE}\n\nContexto atual do usuário: {context_text} Use essas informações para personalizar sua resposta e mostrar que você está acompanhando o progresso dele."
 
 # Dynamic Mission System
+# Catálogo fixo de missões (montado uma vez na importação do módulo)
+DEFAULT_MISSIONS: tuple[MissionDef, ...] = (
+    # MINDFULNESS & MEDITAÇÃO
+    MissionDef(
+        id="mindfulness_meditation_5min",
+        title="Medite por 5 minutos",
+        description="Encontre um local tranquilo e pratique meditação por 5 minutos",
+        category=MissionCategory.MINDFULNESS,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=15,
+        min_level=1,
+        icon="flower",
+        tips=("Use um app de meditação", "Foque na respiração", "Não se preocupe se a mente divagar"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="breathing_478",
+        title="Respiração 4-7-8",
+        description="Pratique a técnica de respiração 4-7-8 por 3 ciclos completos",
+        category=MissionCategory.MINDFULNESS,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=10,
+        min_level=1,
+        icon="leaf",
+        tips=("Inspire por 4 segundos", "Segure por 7 segundos", "Expire por 8 segundos"),
+        estimated_minutes=3
+    ),
+    MissionDef(
+        id="body_scan",
+        title="Body Scan de 3 minutos",
+        description="Faça um escaneamento corporal focando em cada parte do seu corpo",
+        category=MissionCategory.MINDFULNESS,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=12,
+        min_level=2,
+        icon="body",
+        tips=("Comece pela cabeça", "Desça lentamente pelo corpo", "Note tensões sem julgamento"),
+        estimated_minutes=3
+    ),
+    MissionDef(
+        id="mindful_eating",
+        title="Refeição consciente",
+        description="Pratique atenção plena durante uma refeição ou lanche",
+        category=MissionCategory.MINDFULNESS,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=15,
+        min_level=3,
+        icon="restaurant",
+        tips=("Coma devagar", "Saboreie cada mordida", "Note texturas e sabores"),
+        estimated_minutes=15
+    ),
+
+    # GRATIDÃO & POSITIVIDADE
+    MissionDef(
+        id="gratitude_list",
+        title="Liste 3 gratidões",
+        description="Escreva ou pense em 3 coisas pelas quais você é grato hoje",
+        category=MissionCategory.GRATITUDE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=10,
+        min_level=1,
+        icon="heart",
+        tips=("Podem ser coisas simples", "Seja específico", "Sinta a emoção"),
+        estimated_minutes=3
+    ),
+    MissionDef(
+        id="positive_message",
+        title="Mensagem positiva",
+        description="Envie uma mensagem carinhosa ou positiva para alguém especial",
+        category=MissionCategory.GRATITUDE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=12,
+        min_level=1,
+        icon="chatbox-ellipses",
+        tips=("Seja genuíno", "Pode ser um elogio", "Ou só dizer que está pensando na pessoa"),
+        estimated_minutes=2
+    ),
+    MissionDef(
+        id="self_compliment",
+        title="Elogio para si mesmo",
+        description="Escreva um elogio sincero sobre você mesmo",
+        category=MissionCategory.GRATITUDE,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=15,
+        min_level=2,
+        icon="ribbon",
+        tips=("Foque em qualidades pessoais", "Seja gentil consigo", "Aceite suas virtudes"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="happy_moment",
+        title="Momento feliz do dia",
+        description="Anote um momento que te trouxe alegria ou satisfação hoje",
+        category=MissionCategory.GRATITUDE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=8,
+        min_level=1,
+        icon="sunny",
+        tips=("Pode ser algo pequeno", "Reviva a sensação", "Guarde na memória"),
+        estimated_minutes=3
+    ),
+
+    # MOVIMENTO & ENERGIA
+    MissionDef(
+        id="walk_10min",
+        title="Caminhada de 10 minutos",
+        description="Faça uma caminhada ao ar livre ou em casa por 10 minutos",
+        category=MissionCategory.MOVEMENT,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=15,
+        min_level=1,
+        icon="walk",
+        tips=("Pode ser dentro de casa", "Mantenha ritmo confortável", "Respire profundamente"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="stretching_5min",
+        title="Alongamento de 5 minutos",
+        description="Faça alongamentos suaves para relaxar o corpo",
+        category=MissionCategory.MOVEMENT,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=12,
+        min_level=1,
+        icon="fitness",
+        tips=("Alongue pescoço e ombros", "Respire durante os alongamentos", "Vá no seu ritmo"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="dance_song",
+        title="Dance uma música",
+        description="Coloque uma música que você gosta e dance livremente",
+        category=MissionCategory.MOVEMENT,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=18,
+        min_level=1,
+        icon="musical-notes",
+        tips=("Escolha uma música animada", "Dance como quiser", "Divirta-se sem julgamento"),
+        estimated_minutes=4
+    ),
+    MissionDef(
+        id="stairs_exercise",
+        title="Suba e desça escadas",
+        description="Use as escadas 3 vezes como exercício (ou simule o movimento)",
+        category=MissionCategory.MOVEMENT,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=20,
+        min_level=2,
+        icon="trending-up",
+        tips=("Se não tiver escadas, simule o movimento", "Mantenha-se seguro", "Hidrate-se após"),
+        estimated_minutes=5
+    ),
+
+    # CONEXÃO SOCIAL
+    MissionDef(
+        id="call_friend",
+        title="Ligue para alguém querido",
+        description="Faça uma ligação para um amigo, familiar ou pessoa especial",
+        category=MissionCategory.SOCIAL,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=20,
+        min_level=1,
+        icon="call",
+        tips=("Pode ser uma ligação rápida", "Pergunte como a pessoa está", "Compartilhe algo sobre seu dia"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="genuine_compliment",
+        title="Faça um elogio genuíno",
+        description="Dê um elogio sincero para alguém (pessoalmente ou por mensagem)",
+        category=MissionCategory.SOCIAL,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=15,
+        min_level=1,
+        icon="thumbs-up",
+        tips=("Seja específico no elogio", "Note algo que a pessoa fez bem", "Seja autêntico"),
+        estimated_minutes=2
+    ),
+    MissionDef(
+        id="help_someone",
+        title="Ajude alguém hoje",
+        description="Ofereça ajuda para alguém, mesmo que seja algo pequeno",
+        category=MissionCategory.SOCIAL,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=25,
+        min_level=2,
+        icon="people",
+        tips=("Pode ser segurar uma porta", "Ajudar com uma tarefa", "Ou simplesmente ouvir alguém"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="new_conversation",
+        title="Converse com alguém novo",
+        description="Inicie uma conversa amigável com alguém novo ou que você pouco fala",
+        category=MissionCategory.SOCIAL,
+        difficulty=MissionDifficulty.HARD,
+        xp_reward=30,
+        min_level=3,
+        icon="chatbubbles",
+        tips=("Comece com um cumprimento", "Faça uma pergunta aberta", "Seja curioso e respeitoso"),
+        estimated_minutes=15
+    ),
+
+    # AUTOCUIDADO
+    MissionDef(
+        id="relaxing_bath",
+        title="Banho relaxante",
+        description="Tome um banho quente relaxante, focando no momento presente",
+        category=MissionCategory.SELFCARE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=15,
+        min_level=1,
+        icon="water",
+        tips=("Use água numa temperatura agradável", "Foque nas sensações", "Desacelere o ritmo"),
+        estimated_minutes=15
+    ),
+    MissionDef(
+        id="hydrate_water",
+        title="Hidrate-se bem",
+        description="Beba pelo menos 2 copos de água pura",
+        category=MissionCategory.SELFCARE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=8,
+        min_level=1,
+        icon="water-outline",
+        tips=("Beba devagar", "Use um copo bonito", "Adicione limão se quiser"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="organize_space",
+        title="Organize seu espaço",
+        description="Organize e limpe seu ambiente por 10 minutos",
+        category=MissionCategory.SELFCARE,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=18,
+        min_level=2,
+        icon="home",
+        tips=("Comece por uma área pequena", "Coloque as coisas no lugar", "Crie um ambiente mais agradável"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="skincare_routine",
+        title="Cuidados pessoais",
+        description="Dedique tempo aos seus cuidados pessoais (skincare, cabelo, etc.)",
+        category=MissionCategory.SELFCARE,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=20,
+        min_level=1,
+        icon="rose",
+        tips=("Use produtos que tem em casa", "Faça com carinho", "Aproveite o momento"),
+        estimated_minutes=15
+    ),
+
+    # CRIATIVIDADE & EXPRESSÃO
+    MissionDef(
+        id="draw_doodle",
+        title="Desenhe livremente",
+        description="Desenhe ou rabisque por 5 minutos, sem se preocupar com o resultado",
+        category=MissionCategory.CREATIVITY,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=12,
+        min_level=1,
+        icon="brush",
+        tips=("Não precisa ser perfeito", "Use qualquer papel", "Deixe a mão fluir"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="write_feelings",
+        title="Escreva sobre sentimentos",
+        description="Escreva sobre como você se sente hoje, sem censura",
+        category=MissionCategory.CREATIVITY,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=15,
+        min_level=1,
+        icon="journal",
+        tips=("Seja honesto consigo", "Não se preocupe com gramática", "Escreva o que vier à mente"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="sing_song",
+        title="Cante uma música",
+        description="Cante uma música que você gosta, em voz alta ou baixa",
+        category=MissionCategory.CREATIVITY,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=10,
+        min_level=1,
+        icon="mic",
+        tips=("Escolha uma música que te faz bem", "Não se preocupe se desafinar", "Divirta-se!"),
+        estimated_minutes=3
+    ),
+    MissionDef(
+        id="photo_beauty",
+        title="Foto de algo bonito",
+        description="Tire uma foto de algo que considera bonito ao seu redor",
+        category=MissionCategory.CREATIVITY,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=8,
+        min_level=1,
+        icon="camera",
+        tips=("Pode ser algo simples", "Note a beleza no cotidiano", "Aprecie o momento"),
+        estimated_minutes=5
+    ),
+
+    # NATUREZA & AMBIENTE
+    MissionDef(
+        id="outdoor_time",
+        title="10 minutos ao ar livre",
+        description="Passe pelo menos 10 minutos em contato com a natureza",
+        category=MissionCategory.NATURE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=15,
+        min_level=1,
+        icon="leaf-outline",
+        tips=("Pode ser no quintal, varanda ou parque", "Respire o ar fresco", "Observe a natureza"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="plant_care",
+        title="Cuide de uma planta",
+        description="Regue, limpe ou simplesmente observe uma planta com atenção",
+        category=MissionCategory.NATURE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=10,
+        min_level=1,
+        icon="flower-outline",
+        tips=("Se não tem plantas, observe uma na rua", "Note detalhes das folhas", "Aprecie a vida verde"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="sky_watching",
+        title="Observe o céu",
+        description="Pare por alguns minutos para observar o céu e as nuvens",
+        category=MissionCategory.NATURE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=8,
+        min_level=1,
+        icon="cloud",
+        tips=("Procure formas nas nuvens", "Respire profundamente", "Aprecie a imensidão"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="fresh_air",
+        title="Respire ar fresco",
+        description="Abra a janela ou saia por um momento para respirar ar fresco",
+        category=MissionCategory.NATURE,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=5,
+        min_level=1,
+        icon="wind",
+        tips=("Respire profundamente", "Sinta o ar entrando nos pulmões", "Aproveite a sensação"),
+        estimated_minutes=3
+    ),
+
+    # APRENDIZADO & CRESCIMENTO
+    MissionDef(
+        id="read_pages",
+        title="Leia 5 páginas",
+        description="Leia 5 páginas de um livro, artigo ou conteúdo educativo",
+        category=MissionCategory.LEARNING,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=12,
+        min_level=1,
+        icon="library",
+        tips=("Pode ser qualquer tipo de leitura", "Foque no conteúdo", "Aprenda algo novo"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="new_word",
+        title="Aprenda uma palavra nova",
+        description="Pesquise e aprenda o significado de uma palavra que não conhece",
+        category=MissionCategory.LEARNING,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=8,
+        min_level=1,
+        icon="school",
+        tips=("Use um dicionário online", "Tente usar a palavra em uma frase", "Anote se quiser"),
+        estimated_minutes=5
+    ),
+    MissionDef(
+        id="educational_video",
+        title="Vídeo educativo",
+        description="Assista a um vídeo educativo curto sobre algo que te interessa",
+        category=MissionCategory.LEARNING,
+        difficulty=MissionDifficulty.EASY,
+        xp_reward=10,
+        min_level=2,
+        icon="play-circle",
+        tips=("Escolha um tópico interessante", "Pode ser no YouTube", "Tome notas mentais"),
+        estimated_minutes=10
+    ),
+    MissionDef(
+        id="daily_reflection",
+        title="Reflexão diária",
+        description="Reflita sobre uma lição ou aprendizado que teve hoje",
+        category=MissionCategory.LEARNING,
+        difficulty=MissionDifficulty.MEDIUM,
+        xp_reward=15,
+        min_level=2,
+        icon="bulb",
+        tips=("O que você aprendeu hoje?", "Como pode aplicar isso?", "Que insight teve?"),
+        estimated_minutes=8
+    )
+)
+
+# Catálogo de missões em memória, carregado de db.missions na inicialização
+MISSIONS_BY_ID: dict[str, dict] = {}
+MISSIONS_BY_LEVEL: list[dict] = []  # ordenado por min_level
+
+async def load_mission_catalog():
+    """Load the mission catalog from Mongo into process memory"""
+    global MISSIONS_BY_ID, MISSIONS_BY_LEVEL
+    missions = await db.missions.find({}, {"_id": 0}).to_list(None)
+    MISSIONS_BY_LEVEL = sorted(missions, key=lambda mission: mission["min_level"])
+    MISSIONS_BY_ID = {mission["id"]: mission for mission in missions}
+    missions_for_level.cache_clear()
+
+@lru_cache(maxsize=32)
+def missions_for_level(user_level: int) -> tuple[tuple[dict, ...], MappingProxyType]:
+    """Catalog missions unlocked at a level, plus the same missions grouped by category"""
+    available = tuple(mission for mission in MISSIONS_BY_LEVEL if mission["min_level"] <= user_level)
+    by_category = {}
+    for mission in available:
+        by_category.setdefault(mission["category"], []).append(mission)
+    return available, MappingProxyType({category: tuple(group) for category, group in by_category.items()})
+
 async def initialize_mission_database():
     """Initialize the mission database with all available missions"""
-    
-    missions = [
-        # MINDFULNESS & MEDITAÇÃO
-        Mission(
-            id="mindfulness_meditation_5min",
-            title="Medite por 5 minutos",
-            description="Encontre um local tranquilo e pratique meditação por 5 minutos",
-            category=MissionCategory.MINDFULNESS,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=15,
-            min_level=1,
-            icon="flower",
-            tips=["Use um app de meditação", "Foque na respiração", "Não se preocupe se a mente divagar"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="breathing_478",
-            title="Respiração 4-7-8",
-            description="Pratique a técnica de respiração 4-7-8 por 3 ciclos completos",
-            category=MissionCategory.MINDFULNESS,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=10,
-            min_level=1,
-            icon="leaf",
-            tips=["Inspire por 4 segundos", "Segure por 7 segundos", "Expire por 8 segundos"],
-            estimated_minutes=3
-        ),
-        Mission(
-            id="body_scan",
-            title="Body Scan de 3 minutos",
-            description="Faça um escaneamento corporal focando em cada parte do seu corpo",
-            category=MissionCategory.MINDFULNESS,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=12,
-            min_level=2,
-            icon="body",
-            tips=["Comece pela cabeça", "Desça lentamente pelo corpo", "Note tensões sem julgamento"],
-            estimated_minutes=3
-        ),
-        Mission(
-            id="mindful_eating",
-            title="Refeição consciente",
-            description="Pratique atenção plena durante uma refeição ou lanche",
-            category=MissionCategory.MINDFULNESS,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=15,
-            min_level=3,
-            icon="restaurant",
-            tips=["Coma devagar", "Saboreie cada mordida", "Note texturas e sabores"],
-            estimated_minutes=15
-        ),
-
-        # GRATIDÃO & POSITIVIDADE
-        Mission(
-            id="gratitude_list",
-            title="Liste 3 gratidões",
-            description="Escreva ou pense em 3 coisas pelas quais você é grato hoje",
-            category=MissionCategory.GRATITUDE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=10,
-            min_level=1,
-            icon="heart",
-            tips=["Podem ser coisas simples", "Seja específico", "Sinta a emoção"],
-            estimated_minutes=3
-        ),
-        Mission(
-            id="positive_message",
-            title="Mensagem positiva",
-            description="Envie uma mensagem carinhosa ou positiva para alguém especial",
-            category=MissionCategory.GRATITUDE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=12,
-            min_level=1,
-            icon="chatbox-ellipses",
-            tips=["Seja genuíno", "Pode ser um elogio", "Ou só dizer que está pensando na pessoa"],
-            estimated_minutes=2
-        ),
-        Mission(
-            id="self_compliment",
-            title="Elogio para si mesmo",
-            description="Escreva um elogio sincero sobre você mesmo",
-            category=MissionCategory.GRATITUDE,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=15,
-            min_level=2,
-            icon="ribbon",
-            tips=["Foque em qualidades pessoais", "Seja gentil consigo", "Aceite suas virtudes"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="happy_moment",
-            title="Momento feliz do dia",
-            description="Anote um momento que te trouxe alegria ou satisfação hoje",
-            category=MissionCategory.GRATITUDE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=8,
-            min_level=1,
-            icon="sunny",
-            tips=["Pode ser algo pequeno", "Reviva a sensação", "Guarde na memória"],
-            estimated_minutes=3
-        ),
-
-        # MOVIMENTO & ENERGIA
-        Mission(
-            id="walk_10min",
-            title="Caminhada de 10 minutos",
-            description="Faça uma caminhada ao ar livre ou em casa por 10 minutos",
-            category=MissionCategory.MOVEMENT,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=15,
-            min_level=1,
-            icon="walk",
-            tips=["Pode ser dentro de casa", "Mantenha ritmo confortável", "Respire profundamente"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="stretching_5min",
-            title="Alongamento de 5 minutos",
-            description="Faça alongamentos suaves para relaxar o corpo",
-            category=MissionCategory.MOVEMENT,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=12,
-            min_level=1,
-            icon="fitness",
-            tips=["Alongue pescoço e ombros", "Respire durante os alongamentos", "Vá no seu ritmo"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="dance_song",
-            title="Dance uma música",
-            description="Coloque uma música que você gosta e dance livremente",
-            category=MissionCategory.MOVEMENT,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=18,
-            min_level=1,
-            icon="musical-notes",
-            tips=["Escolha uma música animada", "Dance como quiser", "Divirta-se sem julgamento"],
-            estimated_minutes=4
-        ),
-        Mission(
-            id="stairs_exercise",
-            title="Suba e desça escadas",
-            description="Use as escadas 3 vezes como exercício (ou simule o movimento)",
-            category=MissionCategory.MOVEMENT,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=20,
-            min_level=2,
-            icon="trending-up",
-            tips=["Se não tiver escadas, simule o movimento", "Mantenha-se seguro", "Hidrate-se após"],
-            estimated_minutes=5
-        ),
-
-        # CONEXÃO SOCIAL
-        Mission(
-            id="call_friend",
-            title="Ligue para alguém querido",
-            description="Faça uma ligação para um amigo, familiar ou pessoa especial",
-            category=MissionCategory.SOCIAL,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=20,
-            min_level=1,
-            icon="call",
-            tips=["Pode ser uma ligação rápida", "Pergunte como a pessoa está", "Compartilhe algo sobre seu dia"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="genuine_compliment",
-            title="Faça um elogio genuíno",
-            description="Dê um elogio sincero para alguém (pessoalmente ou por mensagem)",
-            category=MissionCategory.SOCIAL,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=15,
-            min_level=1,
-            icon="thumbs-up",
-            tips=["Seja específico no elogio", "Note algo que a pessoa fez bem", "Seja autêntico"],
-            estimated_minutes=2
-        ),
-        Mission(
-            id="help_someone",
-            title="Ajude alguém hoje",
-            description="Ofereça ajuda para alguém, mesmo que seja algo pequeno",
-            category=MissionCategory.SOCIAL,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=25,
-            min_level=2,
-            icon="people",
-            tips=["Pode ser segurar uma porta", "Ajudar com uma tarefa", "Ou simplesmente ouvir alguém"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="new_conversation",
-            title="Converse com alguém novo",
-            description="Inicie uma conversa amigável com alguém novo ou que você pouco fala",
-            category=MissionCategory.SOCIAL,
-            difficulty=MissionDifficulty.HARD,
-            xp_reward=30,
-            min_level=3,
-            icon="chatbubbles",
-            tips=["Comece com um cumprimento", "Faça uma pergunta aberta", "Seja curioso e respeitoso"],
-            estimated_minutes=15
-        ),
-
-        # AUTOCUIDADO
-        Mission(
-            id="relaxing_bath",
-            title="Banho relaxante",
-            description="Tome um banho quente relaxante, focando no momento presente",
-            category=MissionCategory.SELFCARE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=15,
-            min_level=1,
-            icon="water",
-            tips=["Use água numa temperatura agradável", "Foque nas sensações", "Desacelere o ritmo"],
-            estimated_minutes=15
-        ),
-        Mission(
-            id="hydrate_water",
-            title="Hidrate-se bem",
-            description="Beba pelo menos 2 copos de água pura",
-            category=MissionCategory.SELFCARE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=8,
-            min_level=1,
-            icon="water-outline",
-            tips=["Beba devagar", "Use um copo bonito", "Adicione limão se quiser"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="organize_space",
-            title="Organize seu espaço",
-            description="Organize e limpe seu ambiente por 10 minutos",
-            category=MissionCategory.SELFCARE,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=18,
-            min_level=2,
-            icon="home",
-            tips=["Comece por uma área pequena", "Coloque as coisas no lugar", "Crie um ambiente mais agradável"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="skincare_routine",
-            title="Cuidados pessoais",
-            description="Dedique tempo aos seus cuidados pessoais (skincare, cabelo, etc.)",
-            category=MissionCategory.SELFCARE,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=20,
-            min_level=1,
-            icon="rose",
-            tips=["Use produtos que tem em casa", "Faça com carinho", "Aproveite o momento"],
-            estimated_minutes=15
-        ),
-
-        # CRIATIVIDADE & EXPRESSÃO
-        Mission(
-            id="draw_doodle",
-            title="Desenhe livremente",
-            description="Desenhe ou rabisque por 5 minutos, sem se preocupar com o resultado",
-            category=MissionCategory.CREATIVITY,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=12,
-            min_level=1,
-            icon="brush",
-            tips=["Não precisa ser perfeito", "Use qualquer papel", "Deixe a mão fluir"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="write_feelings",
-            title="Escreva sobre sentimentos",
-            description="Escreva sobre como você se sente hoje, sem censura",
-            category=MissionCategory.CREATIVITY,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=15,
-            min_level=1,
-            icon="journal",
-            tips=["Seja honesto consigo", "Não se preocupe com gramática", "Escreva o que vier à mente"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="sing_song",
-            title="Cante uma música",
-            description="Cante uma música que você gosta, em voz alta ou baixa",
-            category=MissionCategory.CREATIVITY,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=10,
-            min_level=1,
-            icon="mic",
-            tips=["Escolha uma música que te faz bem", "Não se preocupe se desafinar", "Divirta-se!"],
-            estimated_minutes=3
-        ),
-        Mission(
-            id="photo_beauty",
-            title="Foto de algo bonito",
-            description="Tire uma foto de algo que considera bonito ao seu redor",
-            category=MissionCategory.CREATIVITY,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=8,
-            min_level=1,
-            icon="camera",
-            tips=["Pode ser algo simples", "Note a beleza no cotidiano", "Aprecie o momento"],
-            estimated_minutes=5
-        ),
-
-        # NATUREZA & AMBIENTE
-        Mission(
-            id="outdoor_time",
-            title="10 minutos ao ar livre",
-            description="Passe pelo menos 10 minutos em contato com a natureza",
-            category=MissionCategory.NATURE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=15,
-            min_level=1,
-            icon="leaf-outline",
-            tips=["Pode ser no quintal, varanda ou parque", "Respire o ar fresco", "Observe a natureza"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="plant_care",
-            title="Cuide de uma planta",
-            description="Regue, limpe ou simplesmente observe uma planta com atenção",
-            category=MissionCategory.NATURE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=10,
-            min_level=1,
-            icon="flower-outline",
-            tips=["Se não tem plantas, observe uma na rua", "Note detalhes das folhas", "Aprecie a vida verde"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="sky_watching",
-            title="Observe o céu",
-            description="Pare por alguns minutos para observar o céu e as nuvens",
-            category=MissionCategory.NATURE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=8,
-            min_level=1,
-            icon="cloud",
-            tips=["Procure formas nas nuvens", "Respire profundamente", "Aprecie a imensidão"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="fresh_air",
-            title="Respire ar fresco",
-            description="Abra a janela ou saia por um momento para respirar ar fresco",
-            category=MissionCategory.NATURE,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=5,
-            min_level=1,
-            icon="wind",
-            tips=["Respire profundamente", "Sinta o ar entrando nos pulmões", "Aproveite a sensação"],
-            estimated_minutes=3
-        ),
-
-        # APRENDIZADO & CRESCIMENTO
-        Mission(
-            id="read_pages",
-            title="Leia 5 páginas",
-            description="Leia 5 páginas de um livro, artigo ou conteúdo educativo",
-            category=MissionCategory.LEARNING,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=12,
-            min_level=1,
-            icon="library",
-            tips=["Pode ser qualquer tipo de leitura", "Foque no conteúdo", "Aprenda algo novo"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="new_word",
-            title="Aprenda uma palavra nova",
-            description="Pesquise e aprenda o significado de uma palavra que não conhece",
-            category=MissionCategory.LEARNING,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=8,
-            min_level=1,
-            icon="school",
-            tips=["Use um dicionário online", "Tente usar a palavra em uma frase", "Anote se quiser"],
-            estimated_minutes=5
-        ),
-        Mission(
-            id="educational_video",
-            title="Vídeo educativo",
-            description="Assista a um vídeo educativo curto sobre algo que te interessa",
-            category=MissionCategory.LEARNING,
-            difficulty=MissionDifficulty.EASY,
-            xp_reward=10,
-            min_level=2,
-            icon="play-circle",
-            tips=["Escolha um tópico interessante", "Pode ser no YouTube", "Tome notas mentais"],
-            estimated_minutes=10
-        ),
-        Mission(
-            id="daily_reflection",
-            title="Reflexão diária",
-            description="Reflita sobre uma lição ou aprendizado que teve hoje",
-            category=MissionCategory.LEARNING,
-            difficulty=MissionDifficulty.MEDIUM,
-            xp_reward=15,
-            min_level=2,
-            icon="bulb",
-            tips=["O que você aprendeu hoje?", "Como pode aplicar isso?", "Que insight teve?"],
-            estimated_minutes=8
-        )
-    ]
-
     # Check if missions are already in database
     existing_count = await db.missions.count_documents({})
     
-    if existing_count == 0:
+    if existing_count < len(DEFAULT_MISSIONS):
         logger.info("Initializing mission database with all missions...")
-        for mission in missions:
-            await db.missions.insert_one(mission.dict())
-        logger.info(f"Added {len(missions)} missions to database")
+        result = await db.missions.bulk_write(
+            [UpdateOne({"id": mission.id}, {"$setOnInsert": asdict(mission)}, upsert=True) for mission in DEFAULT_MISSIONS],
+            ordered=False
+        )
+        logger.info("Added %s missions to database", result.upserted_count)
     else:
-        logger.info(f"Mission database already initialized with {existing_count} missions")
+        logger.info("Mission database already initialized with %s missions", existing_count)
+    
+    await load_mission_catalog()
 
 async def get_daily_missions_for_user(user_id: str, user_level: int = 1) -> List[dict]:
     """Generate or retrieve daily missions for a user"""
-    today = datetime.utcnow().date()
-    today_start = datetime.combine(today, datetime.min.time())
+    today_start = utc_today_start()
     
     # Check if user already has missions for today
     existing_set = await db.daily_mission_sets.find_one({
@@ -1894,90 +2325,131 @@ async def get_daily_missions_for_user(user_id: str, user_level: int = 1) -> List
     })
     
     if existing_set:
-        # Get missions for existing set
-        mission_ids = existing_set["missions"]
-        missions = []
-        for mission_id in mission_ids:
-            mission = await db.missions.find_one({"id": mission_id})
-            if mission:
-                missions.append(mission)
+        # Get missions for existing set from the catalog, keeping the set's order
+        missions = [
+            dict(MISSIONS_BY_ID[mission_id])
+            for mission_id in existing_set["missions"]
+            if mission_id in MISSIONS_BY_ID
+        ]
     else:
         # Generate new missions for today
-        import random
-        
-        # Get all available missions for user level
-        available_missions = await db.missions.find({
-            "min_level": {"$lte": user_level}
-        }).to_list(100)
-        
-        # Group by category to ensure variety
-        by_category = {}
-        for mission in available_missions:
-            category = mission["category"]
-            if category not in by_category:
-                by_category[category] = []
-            by_category[category].append(mission)
-        
-        # Select 3 missions from different categories when possible
-        selected_missions = []
-        categories_used = []
-        
-        # Try to get one from each category first
-        available_categories = list(by_category.keys())
-        random.shuffle(available_categories)
-        
-        for category in available_categories:
-            if len(selected_missions) < 3:
-                mission = random.choice(by_category[category])
-                selected_missions.append(mission)
-                categories_used.append(category)
-        
-        # If we need more missions, fill from unused categories or randomly
-        while len(selected_missions) < 3:
-            remaining_missions = [m for m in available_missions if m not in selected_missions]
-            if remaining_missions:
-                selected_missions.append(random.choice(remaining_missions))
+        # Available missions for user level, grouped by category to ensure variety
+        available_missions, by_category = missions_for_level(user_level)
+        
+        # Select 3 missions from different categories when possible:
+        # one random mission from each of up to 3 random categories
+        categories = random.sample(list(by_category), k=min(3, len(by_category)))
+        selected_missions = [random.choice(by_category[category]) for category in categories]
+        
+        # If we need more missions, fill randomly from the ones not picked yet
+        missing = 3 - len(selected_missions)
+        if missing > 0:
+            picked_ids = {m["id"] for m in selected_missions}
+            remaining_missions = [m for m in available_missions if m["id"] not in picked_ids]
+            selected_missions.extend(random.sample(remaining_missions, k=min(missing, len(remaining_missions))))
         
         # Save daily mission set
         mission_set = DailyMissionSet(
-            id=str(uuid.uuid4()),
+            id=_new_id(),
             date=datetime.utcnow(),
-            missions=[m["id"] for m in selected_missions],
+            missions=tuple(m["id"] for m in selected_missions),
             user_id=user_id
         )
         
-        await db.daily_mission_sets.insert_one(mission_set.dict())
-        missions = selected_missions
+        await db.daily_mission_sets.insert_one(mission_set.model_dump())
+        missions = [dict(mission) for mission in selected_missions]
     
-    # Get user progress for today's missions and clean ObjectIds
-    for mission in missions:
-        # Convert ObjectId to string
-        if "_id" in mission:
-            mission["_id"] = str(mission["_id"])
-            
-        progress = await db.user_mission_progress.find_one({
+    # Get user progress for all of today's missions at once
+    progress_docs = await db.user_mission_progress.find(
+        {
             "user_id": user_id,
-            "mission_id": mission["id"],
+            "mission_id": {"$in": [mission["id"] for mission in missions]},
             "date": {"$gte": today_start}
-        })
-        
+        },
+        {"mission_id": 1, "completed": 1}
+    ).to_list(len(missions))
+    progress_by_mission = {progress["mission_id"]: progress for progress in progress_docs}
+    
+    # Attach progress
+    for mission in missions:
+        progress = progress_by_mission.get(mission["id"])
         mission["completed"] = progress["completed"] if progress else False
         mission["progress_id"] = str(progress["_id"]) if progress else None
     
     return missions
 
+# (collection, keys, options) for every index the hot query paths rely on
+INDEX_SPECS = [
+    ("users", "email", {"unique": True}),
+    ("users", "id", {"unique": True}),
+    ("humor_diario", [("user_id", 1), ("date", -1)], {}),
+    ("user_mission_progress", [("user_id", 1), ("mission_id", 1), ("date", -1)], {}),
+    ("missions", "id", {}),
+    ("daily_mission_sets", [("user_id", 1), ("date", -1)], {}),
+    ("breathing_sessions", [("user_id", 1), ("completed", 1), ("date", 1)], {}),
+    ("gratitude_entries", [("user_id", 1), ("date", -1)], {}),
+    ("user_reminders", [("user_id", 1), ("created_at", -1)], {}),
+    ("user_reminders", [("id", 1), ("user_id", 1)], {}),
+    # Entries written before date_bucket existed are left out of the uniqueness check
+    ("gratitude_entries", [("user_id", 1), ("date_bucket", 1)], {
+        "unique": True,
+        "partialFilterExpression": {"date_bucket": {"$type": "string"}}
+    }),
+    ("user_stats", "user_id", {"unique": True}),
+    ("user_subscriptions", "user_id", {"unique": True}),
+    ("subscription_plans", [("is_active", 1), ("id", 1)], {}),
+    # Ebook transactions use "session_id" and never set stripe_session_id
+    ("payment_transactions", "stripe_session_id", {
+        "unique": True,
+        "partialFilterExpression": {"stripe_session_id": {"$type": "string"}}
+    }),
+    ("payment_transactions", "session_id", {"sparse": True}),
+    ("webhook_events", [("provider", 1), ("event_id", 1)], {"unique": True}),
+    ("chat_messages", [("conversation_id", 1), ("user_id", 1), ("timestamp", 1)], {}),
+    ("chat_conversations", [("user_id", 1), ("updated_at", -1)], {}),
+    ("chat_conversations", "id", {"unique": True}),
+    # Admin quote listing by status (the unfiltered listing walks the _id index)
+    ("corporate_quotes", [("status", 1), ("_id", -1)], {}),
+    ("corporate_transactions", "session_id", {"unique": True}),
+]
+
+async def ensure_indexes():
+    """Create indexes for the hot query paths (no-op if they already exist)"""
+    for collection, keys, options in INDEX_SPECS:
+        # One failing index (e.g. duplicates blocking a unique one) must not skip the rest
+        try:
+            await db[collection].create_index(keys, **options)
+        except Exception as e:
+            logger.error("Error creating index %s on %s: %s", keys, collection, e)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize app on startup"""
+    # Configure logging once per worker process (no-op if a handler is already set up)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    # Open the first pooled connections before traffic arrives
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        logger.error("MongoDB ping failed on startup: %s", e)
+    await ensure_indexes()
     await initialize_default_plans()
     await initialize_mission_database()
 
+# Origens do frontend web, separadas por vírgula (ex.: "https://app.example.com,http://localhost:3000")
+CORS_ORIGINS = [origin.strip() for origin in os.environ.get('CORS_ORIGINS', '*').split(',') if origin.strip()]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*", "http://localhost:3000", "http://localhost:8000", "http://127.0.0.1:3000"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*", "Authorization", "Content-Type"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["*"],
+    max_age=86400,  # browsers reuse the preflight result for a day
 )
 
 # ============================================
@@ -2069,6 +2541,9 @@ class ReminderUpdate(BaseModel):
 # GRATITUDE JOURNAL ENDPOINTS
 # ============================================
 
+# Only the fields GratitudeEntryResponse is built from
+GRATITUDE_RESPONSE_PROJECTION = {"_id": 0, "id": 1, "gratitudes": 1, "reflection": 1, "date": 1, "created_at": 1}
+
 @api_router.post("/gratitude", response_model=GratitudeEntryResponse)
 async def create_gratitude_entry(
     entry: GratitudeEntryCreate,
@@ -2076,58 +2551,52 @@ async def create_gratitude_entry(
 ):
     """Create a new gratitude journal entry"""
     try:
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Check if entry already exists for today
-        existing = await db.gratitude_entries.find_one({
-            "user_id": current_user.id,
-            "date": {"$gte": today, "$lt": today + timedelta(days=1)}
-        })
-        
-        if existing:
-            raise HTTPException(status_code=400, detail="Você já registrou gratidão hoje. Edite a entrada existente.")
+        today = utc_today_start()
         
         entry_dict = {
-            "id": str(uuid.uuid4()),
+            "id": _new_id(),
             "user_id": current_user.id,
             "gratitudes": entry.gratitudes[:3],  # Max 3
             "reflection": entry.reflection,
             "date": today,
+            "date_bucket": today.strftime("%Y-%m-%d"),
             "created_at": datetime.utcnow()
         }
         
-        await db.gratitude_entries.insert_one(entry_dict)
+        # The unique (user_id, date_bucket) index rejects a second entry for today
+        try:
+            await db.gratitude_entries.insert_one(entry_dict)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Você já registrou gratidão hoje. Edite a entrada existente.")
         
         # Award 10 stars for gratitude practice
-        await db.user_stats.update_one(
-            {"user_id": current_user.id},
-            {"$inc": {"total_xp": 10}}
-        )
-        
-        return GratitudeEntryResponse(
-            id=entry_dict["id"],
-            gratitudes=entry_dict["gratitudes"],
-            reflection=entry_dict["reflection"],
-            date=entry_dict["date"].isoformat(),
-            created_at=entry_dict["created_at"].isoformat()
-        )
+        await update_user_stats(current_user.id, 10)
+        
+        # Already in response shape; orjson renders the datetimes as ISO strings
+        return ORJSONResponse({
+            "id": entry_dict["id"],
+            "gratitudes": entry_dict["gratitudes"],
+            "reflection": entry_dict["reflection"],
+            "date": entry_dict["date"],
+            "created_at": entry_dict["created_at"]
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating gratitude entry: {e}")
+        logger.error("Error creating gratitude entry: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao criar entrada de gratidão")
 
 @api_router.get("/gratitude/today")
 async def get_today_gratitude(current_user: User = Depends(get_current_user)):
     """Get today's gratitude entry"""
     try:
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        today = utc_today_start()
         
-        entry = await db.gratitude_entries.find_one({
-            "user_id": current_user.id,
-            "date": {"$gte": today, "$lt": today + timedelta(days=1)}
-        })
+        entry = await db.gratitude_entries.find_one(
+            {"user_id": current_user.id, "date_bucket": today.strftime("%Y-%m-%d")},
+            GRATITUDE_RESPONSE_PROJECTION
+        )
         
         if not entry:
             return None
@@ -2141,7 +2610,7 @@ async def get_today_gratitude(current_user: User = Depends(get_current_user)):
         )
         
     except Exception as e:
-        logger.error(f"Error fetching today's gratitude: {e}")
+        logger.error("Error fetching today's gratitude: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao buscar gratidão de hoje")
 
 @api_router.get("/gratitude/history")
@@ -2152,7 +2621,8 @@ async def get_gratitude_history(
     """Get gratitude history"""
     try:
         entries = await db.gratitude_entries.find(
-            {"user_id": current_user.id}
+            {"user_id": current_user.id},
+            GRATITUDE_RESPONSE_PROJECTION
         ).sort("date", -1).limit(limit).to_list(length=limit)
         
         return [
@@ -2167,7 +2637,7 @@ async def get_gratitude_history(
         ]
         
     except Exception as e:
-        logger.error(f"Error fetching gratitude history: {e}")
+        logger.error("Error fetching gratitude history: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao buscar histórico")
 
 # ============================================
@@ -2181,67 +2651,62 @@ async def create_breathing_session(
 ):
     """Record a breathing exercise session"""
     try:
+        now = datetime.utcnow()
         session_dict = {
-            "id": str(uuid.uuid4()),
+            "id": _new_id(),
             "user_id": current_user.id,
             "technique": session.technique.value,
             "duration_seconds": session.duration_seconds,
             "completed": session.completed,
-            "date": datetime.utcnow(),
-            "created_at": datetime.utcnow()
+            "date": now,
+            "created_at": now
         }
         
+        # Stars are only awarded for a session that was actually stored
         await db.breathing_sessions.insert_one(session_dict)
         
         # Award stars (5 stars per session)
         stars_earned = 5 if session.completed else 0
         if stars_earned > 0:
-            await db.user_stats.update_one(
-                {"user_id": current_user.id},
-                {"$inc": {"total_xp": stars_earned}}
-            )
-        
-        return BreathingSessionResponse(
-            id=session_dict["id"],
-            technique=session_dict["technique"],
-            duration_seconds=session_dict["duration_seconds"],
-            completed=session_dict["completed"],
-            date=session_dict["date"].isoformat(),
-            stars_earned=stars_earned
-        )
+            await update_user_stats(current_user.id, stars_earned)
+        
+        return ORJSONResponse({
+            "id": session_dict["id"],
+            "technique": session_dict["technique"],
+            "duration_seconds": session_dict["duration_seconds"],
+            "completed": session_dict["completed"],
+            "date": session_dict["date"],
+            "stars_earned": stars_earned
+        })
         
     except Exception as e:
-        logger.error(f"Error creating breathing session: {e}")
+        logger.error("Error creating breathing session: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao registrar sessão")
 
 @api_router.get("/breathing/stats")
 async def get_breathing_stats(current_user: User = Depends(get_current_user)):
     """Get breathing exercise statistics"""
     try:
-        # Count total sessions
-        total_sessions = await db.breathing_sessions.count_documents({
-            "user_id": current_user.id,
-            "completed": True
-        })
-        
-        # Get sessions this week
         week_ago = datetime.utcnow() - timedelta(days=7)
-        week_sessions = await db.breathing_sessions.count_documents({
-            "user_id": current_user.id,
-            "completed": True,
-            "date": {"$gte": week_ago}
-        })
         
-        # Get favorite technique
+        # Total sessions, sessions this week and favorite technique in one pass
         pipeline = [
             {"$match": {"user_id": current_user.id, "completed": True}},
-            {"$group": {"_id": "$technique", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1}
+            {"$facet": {
+                "total": [{"$count": "n"}],
+                "week": [{"$match": {"date": {"$gte": week_ago}}}, {"$count": "n"}],
+                "favorite": [
+                    {"$group": {"_id": "$technique", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$limit": 1}
+                ]
+            }}
         ]
         
-        favorite = await db.breathing_sessions.aggregate(pipeline).to_list(length=1)
-        favorite_technique = favorite[0]["_id"] if favorite else None
+        stats = (await db.breathing_sessions.aggregate(pipeline).to_list(length=1))[0]
+        total_sessions = stats["total"][0]["n"] if stats["total"] else 0
+        week_sessions = stats["week"][0]["n"] if stats["week"] else 0
+        favorite_technique = stats["favorite"][0]["_id"] if stats["favorite"] else None
         
         return {
             "total_sessions": total_sessions,
@@ -2251,7 +2716,7 @@ async def get_breathing_stats(current_user: User = Depends(get_current_user)):
         }
         
     except Exception as e:
-        logger.error(f"Error fetching breathing stats: {e}")
+        logger.error("Error fetching breathing stats: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao buscar estatísticas")
 
 # ============================================
@@ -2263,17 +2728,14 @@ async def get_reminders(current_user: User = Depends(get_current_user)):
     """Get all user reminders"""
     try:
         reminders = await db.user_reminders.find(
-            {"user_id": current_user.id}
+            {"user_id": current_user.id},
+            {"_id": 0}
         ).sort("created_at", -1).to_list(length=100)
         
-        # Remove MongoDB _id field
-        for reminder in reminders:
-            reminder.pop("_id", None)
-        
-        return reminders
+        return ORJSONResponse(reminders)
         
     except Exception as e:
-        logger.error(f"Error fetching reminders: {e}")
+        logger.error("Error fetching reminders: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao buscar lembretes")
 
 @api_router.post("/reminders")
@@ -2284,7 +2746,7 @@ async def create_reminder(
     """Create a new reminder"""
     try:
         now = datetime.utcnow()
-        reminder_id = str(uuid.uuid4())
+        reminder_id = _new_id()
         
         # Create document to insert
         db_document = {
@@ -2301,21 +2763,12 @@ async def create_reminder(
         
         await db.user_reminders.insert_one(db_document)
         
-        # Return clean response without MongoDB _id
-        return {
-            "id": reminder_id,
-            "user_id": current_user.id,
-            "type": reminder.type.value,
-            "title": reminder.title,
-            "time": reminder.time,
-            "enabled": reminder.enabled,
-            "days": reminder.days,
-            "created_at": now.isoformat(),
-            "updated_at": now.isoformat()
-        }
+        # Return the stored document without the _id insert_one added
+        db_document.pop("_id", None)
+        return ORJSONResponse(db_document)
         
     except Exception as e:
-        logger.error(f"Error creating reminder: {e}")
+        logger.error("Error creating reminder: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao criar lembrete")
 
 @api_router.patch("/reminders/{reminder_id}")
@@ -2326,24 +2779,26 @@ async def update_reminder(
 ):
     """Update a reminder"""
     try:
-        update_data = {k: v for k, v in reminder.dict().items() if v is not None}
+        update_data = reminder.model_dump(exclude_none=True)
         update_data["updated_at"] = datetime.utcnow()
         
-        result = await db.user_reminders.update_one(
+        # Update and read back in one round trip
+        updated = await db.user_reminders.find_one_and_update(
             {"id": reminder_id, "user_id": current_user.id},
-            {"$set": update_data}
+            {"$set": update_data},
+            {"_id": 0},
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.matched_count == 0:
+        if not updated:
             raise HTTPException(status_code=404, detail="Lembrete não encontrado")
         
-        updated = await db.user_reminders.find_one({"id": reminder_id})
         return updated
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating reminder: {e}")
+        logger.error("Error updating reminder: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao atualizar lembrete")
 
 @api_router.delete("/reminders/{reminder_id}")
@@ -2366,7 +2821,7 @@ async def delete_reminder(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting reminder: {e}")
+        logger.error("Error deleting reminder: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao deletar lembrete")
 
 # ============================================
@@ -2385,41 +2840,40 @@ async def create_checkout_session(
     """Create Stripe checkout session for ebook purchase"""
     try:
         # Validate ebook package
-        if request.ebook_id not in EBOOK_PACKAGES:
+        package = EBOOK_PACKAGE_TUPLES.get(request.ebook_id)
+        if package is None:
             raise HTTPException(status_code=400, detail="Ebook inválido")
         
-        package = EBOOK_PACKAGES[request.ebook_id]
-        
         # Create Stripe checkout session
-        if not STRIPE_API_KEY:
+        if not stripe_client:
             raise HTTPException(status_code=500, detail="Stripe not configured")
         
         success_url = f"{request.origin_url}/store/success?session_id={{CHECKOUT_SESSION_ID}}"
         cancel_url = f"{request.origin_url}/store"
         
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
+        session = await stripe_client.v1.checkout.sessions.create_async({
+            'payment_method_types': ['card'],
+            'line_items': [{
                 'price_data': {
                     'currency': package.currency,
                     'unit_amount': int(package.price * 100),
                     'product_data': {
                         'name': package.title,
-                        'description': package.description
+                        'description': package.category
                     },
                 },
                 'quantity': 1,
             }],
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
-            metadata={
+            'mode': 'payment',
+            'success_url': success_url,
+            'cancel_url': cancel_url,
+            'metadata': {
                 "ebook_id": package.id,
                 "ebook_title": package.title,
                 "user_id": current_user.id,
                 "user_email": current_user.email
             }
-        )
+        })
         
         # Create payment transaction record
         transaction = PaymentTransaction(
@@ -2438,7 +2892,7 @@ async def create_checkout_session(
         )
         
         # Insert transaction into database
-        await db.payment_transactions.insert_one(transaction.dict())
+        await db.payment_transactions.insert_one(transaction.model_dump(exclude_none=True))
         
         return {
             "url": session.url,
@@ -2448,7 +2902,7 @@ async def create_checkout_session(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating checkout session: {e}")
+        logger.error("Error creating checkout session: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao criar sessão de pagamento")
 
 @api_router.get("/payments/checkout/status/{session_id}")
@@ -2459,43 +2913,34 @@ async def get_checkout_status(
     """Get payment status for checkout session"""
     try:
         # Get Stripe session
-        if not STRIPE_API_KEY:
+        if not stripe_client:
             raise HTTPException(status_code=500, detail="Stripe not configured")
         
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = await stripe_client.v1.checkout.sessions.retrieve_async(session_id)
         
-        # Find transaction in database
-        transaction = await db.payment_transactions.find_one({"session_id": session_id})
-        if not transaction:
-            raise HTTPException(status_code=404, detail="Transação não encontrada")
-        
-        # Update transaction status if payment is complete
-        if session.payment_status == "paid" and transaction["payment_status"] != "paid":
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {
-                    "$set": {
-                        "payment_status": "paid",
-                        "status": "completed",
-                        "updated_at": datetime.utcnow()
-                    }
-                }
+        # Final Stripe states are applied with one conditional write; it only matches
+        # when the stored state differs, so concurrent polls apply it once
+        if session.payment_status == "paid":
+            transaction = await db.payment_transactions.find_one_and_update(
+                {"session_id": session_id, "payment_status": {"$ne": "paid"}},
+                {"$set": {"payment_status": "paid", "status": "completed", "updated_at": datetime.utcnow()}},
+                {"_id": 1}
             )
             
             # TODO: Add ebook to user's library here
             # await add_ebook_to_user_library(current_user.id, transaction["ebook_id"])
-        
-        elif status_response.status == "expired" and transaction["status"] != "expired":
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {
-                    "$set": {
-                        "payment_status": "expired",
-                        "status": "expired",
-                        "updated_at": datetime.utcnow()
-                    }
-                }
+        elif session.status == "expired":
+            transaction = await db.payment_transactions.find_one_and_update(
+                {"session_id": session_id, "status": {"$ne": "expired"}},
+                {"$set": {"payment_status": "expired", "status": "expired", "updated_at": datetime.utcnow()}},
+                {"_id": 1}
             )
+        else:
+            transaction = None
+        
+        # Nothing was updated: the state was already applied, or the transaction doesn't exist
+        if transaction is None and not await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Transação não encontrada")
         
         return {
             "session_id": session_id,
@@ -2508,66 +2953,75 @@ async def get_checkout_status(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting checkout status: {e}")
+        logger.error("Error getting checkout status: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao verificar status do pagamento")
 
+async def process_stripe_checkout_completed(session_id: str, checkout_type, event_id):
+    """Mark the ebook/corporate transaction paid; runs after the webhook has been acknowledged"""
+    # Corporate licenses are recorded apart from ebook purchases
+    collection = db.corporate_transactions if checkout_type == "corporate_license" else db.payment_transactions
+    try:
+        await collection.update_one(
+            {"session_id": session_id},
+            {
+                "$set": {
+                    "payment_status": "paid",
+                    "status": "completed",
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
+    except Exception as e:
+        logger.error("Error processing Stripe checkout %s: %s", session_id, e)
+        # Allow a manual resend from the Stripe dashboard to be processed again
+        if event_id is not None:
+            await release_webhook_event("stripe", event_id)
+
 @api_router.post("/webhook/stripe")
-async def stripe_webhook(request: Request):
+async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
     """Handle Stripe webhooks"""
+    body = await request.body()
+    signature = request.headers.get("Stripe-Signature")
+    
+    if not STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(status_code=500, detail="Stripe webhook not configured")
+    
+    # Parse and authenticate the event against the endpoint's signing secret
     try:
-        # Get request body
-        body = await request.body()
-        signature = request.headers.get("Stripe-Signature")
-        
-        if not STRIPE_API_KEY:
-            raise HTTPException(status_code=500, detail="Stripe not configured")
-        
-        # Parse webhook event
-        try:
-            event = stripe.Event.construct_from(
-                json.loads(body), stripe.api_key
-            )
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid payload")
+        event = stripe.Webhook.construct_event(body, signature, STRIPE_WEBHOOK_SECRET)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payload")
+    except stripe.SignatureVerificationError:
+        raise HTTPException(status_code=400, detail="Invalid signature")
+    
+    # Only a verified event may claim its id; a forged request can't shadow a real delivery
+    event_id = event.id
+    try:
+        # Stripe delivers at least once; skip events already processed
+        if event_id is not None and not await claim_webhook_event("stripe", event_id):
+            logger.info("Duplicate Stripe event %s ignored", event_id)
+            return {"status": "duplicate"}
         
-        # Handle the event
+        # Acknowledge right away; the DB work runs after the response is sent.
+        # Only verified events reach this point, and only a paid session is marked paid
         if event['type'] == 'checkout.session.completed':
             session = event['data']['object']
-            session_id = session['id']
-            
-            # Update transaction
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {
-                    "$set": {
-                        "payment_status": "paid",
-                        "status": "completed",
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
+            if session['payment_status'] == 'paid':
+                checkout_type = session['metadata'].to_dict().get('type')
+                background_tasks.add_task(process_stripe_checkout_completed, session['id'], checkout_type, event_id)
         
         return {"status": "success"}
         
     except Exception as e:
-        logger.error(f"Error handling Stripe webhook: {e}")
+        logger.error("Error handling Stripe webhook: %s", e)
+        if event_id is not None:
+            await release_webhook_event("stripe", event_id)
         raise HTTPException(status_code=500, detail="Erro ao processar webhook")
 
 @api_router.get("/payments/packages")
 async def get_ebook_packages():
     """Get available ebook packages"""
-    return {
-        "packages": [
-            {
-                "id": package.id,
-                "title": package.title,
-                "price": package.price,
-                "category": package.category,
-                "currency": package.currency
-            }
-            for package in EBOOK_PACKAGES.values()
-        ]
-    }
+    return {"packages": list(EBOOK_PACKAGE_DICTS.values())}
 
 # ============================================
 # CORPORATE QUOTES ENDPOINTS
@@ -2583,6 +3037,13 @@ class CorporateQuoteRequest(BaseModel):
     selectedPlan: Optional[str] = None
     source: str = "corporate_website"
 
+# Preço por funcionário (BRL) de cada plano corporativo
+CORPORATE_PLAN_PRICES = MappingProxyType({
+    'starter': 15,
+    'business': 12,
+    'enterprise': 8
+})
+
 class CorporateCheckoutRequest(BaseModel):
     company: str
     name: str
@@ -2591,100 +3052,149 @@ class CorporateCheckoutRequest(BaseModel):
     employees: int
     plan: str  # starter, business, enterprise
     origin_url: str
+    
+    @validator('plan')
+    def validate_plan(cls, v):
+        if v not in CORPORATE_PLAN_PRICES:
+            raise ValueError('Plano inválido')
+        return v
+    
+    @property
+    def price_per_employee(self):
+        return CORPORATE_PLAN_PRICES[self.plan]
+    
+    @property
+    def total_amount(self):
+        return self.price_per_employee * self.employees
 
 @api_router.post("/corporate/quote")
 async def create_corporate_quote(request: CorporateQuoteRequest):
     """Create a corporate quote request"""
+    now = datetime.utcnow()
+    
+    # Create quote record
+    quote = {
+        "id": _new_id(),
+        "company": request.company,
+        "name": request.name,
+        "email": request.email,
+        "phone": request.phone,
+        "employees": request.employees,
+        "message": request.message,
+        "selected_plan": request.selectedPlan,
+        "source": request.source,
+        "status": "pending",
+        "created_at": now,
+        "updated_at": now
+    }
+    
+    # Insert into database; a lead is only acknowledged once it is stored
     try:
-        # Create quote record
-        quote = {
-            "id": str(uuid.uuid4()),
-            "company": request.company,
-            "name": request.name,
-            "email": request.email,
-            "phone": request.phone,
-            "employees": request.employees,
-            "message": request.message,
-            "selected_plan": request.selectedPlan,
-            "source": request.source,
-            "status": "pending",
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Insert into database
         await db.corporate_quotes.insert_one(quote)
-        
-        # TODO: Send notification email to sales team
-        # TODO: Send confirmation email to customer
-        
-        logger.info(f"Corporate quote created for {request.company} ({request.employees} employees)")
-        
-        return {
-            "success": True,
-            "message": "Orçamento solicitado com sucesso",
-            "quote_id": quote["id"]
-        }
-        
-    except Exception as e:
-        logger.error(f"Error creating corporate quote: {e}")
+    except PyMongoError as e:
+        logger.error("Error creating corporate quote: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao processar solicitação de orçamento")
+    _quotes_page_cache.clear()
+    
+    # TODO: Send notification email to sales team
+    # TODO: Send confirmation email to customer
+    
+    logger.info("Corporate quote created for %s (%s employees)", request.company, request.employees)
+    
+    return {
+        "success": True,
+        "message": "Orçamento solicitado com sucesso",
+        "quote_id": quote["id"]
+    }
+
+# Páginas já codificadas da listagem de orçamentos; limpas a cada novo orçamento
+_quotes_page_cache = TTLCache(maxsize=64, ttl=15)
 
 @api_router.get("/corporate/quotes")
 async def get_corporate_quotes(
     status: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
 ):
     """Get corporate quotes (admin endpoint)"""
     try:
-        query = {}
-        if status:
-            query["status"] = status
-            
-        quotes = await db.corporate_quotes.find(query).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
+        # Dashboard polling is served from the short-lived page cache
+        cache_key = (status, skip, cursor, limit)
+        body = _quotes_page_cache.get(cache_key)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
         
-        # Clean ObjectIds
-        for quote in quotes:
-            if "_id" in quote:
-                quote["_id"] = str(quote["_id"])
+        count_query = {}
+        if status:
+            count_query["status"] = status
+        
+        # Keyset pagination on _id, newest first. _id is generated at insert time
+        # alongside created_at, so it orders quotes the same way; skip still works
+        # for existing callers but cursor avoids walking the skipped documents
+        query = dict(count_query)
+        if cursor:
+            try:
+                query["_id"] = {"$lt": ObjectId(cursor)}
+            except InvalidId:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        
+        pipeline = [{"$match": query}, {"$sort": {"_id": -1}}]
+        if skip:
+            pipeline.append({"$skip": skip})
+        pipeline += [
+            {"$limit": limit},
+            # _id comes back already stringified by Mongo; it doubles as the page cursor
+            {"$addFields": {"_id": {"$toString": "$_id"}}}
+        ]
+        quotes, total = await asyncio.gather(
+            db.corporate_quotes.aggregate(pipeline).to_list(limit),
+            db.corporate_quotes.count_documents(count_query)
+        )
+        next_cursor = quotes[-1]["_id"] if len(quotes) == limit else None
         
-        return {
+        body = _quotes_page_cache[cache_key] = orjson.dumps({
             "quotes": quotes,
-            "total": await db.corporate_quotes.count_documents(query)
-        }
+            "total": total,
+            "next_cursor": next_cursor
+        })
+        return Response(content=body, media_type="application/json")
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching corporate quotes: {e}")
+        logger.error("Error fetching corporate quotes: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao buscar orçamentos")
 
+# Janela em que pedidos idênticos (clique duplo, retry) recebem a mesma sessão Stripe
+CORPORATE_CHECKOUT_DEDUPE_SECONDS = 60
+
+def corporate_checkout_idempotency_key(request: CorporateCheckoutRequest) -> str:
+    """Stripe idempotency key for a checkout request within the current dedupe window"""
+    fields = (
+        request.company, request.name, request.email, request.phone or "",
+        str(request.employees), request.plan, request.origin_url,
+        str(int(time.time() // CORPORATE_CHECKOUT_DEDUPE_SECONDS))
+    )
+    return "corporate-checkout-" + hashlib.sha256("\x1f".join(fields).encode()).hexdigest()
+
 @api_router.post("/corporate/checkout")
 async def create_corporate_checkout(request: CorporateCheckoutRequest):
     """Create Stripe checkout session for corporate license purchase"""
+    price_per_employee = request.price_per_employee
+    total_amount = request.total_amount
+    
+    # Create Stripe checkout session
+    if not stripe_client:
+        raise HTTPException(status_code=500, detail="Stripe not configured")
+    
+    success_url = f"{request.origin_url}/corporate-success?session_id={{CHECKOUT_SESSION_ID}}"
+    cancel_url = f"{request.origin_url}"
+    
     try:
-        # Define plan pricing
-        plan_prices = {
-            'starter': 15,
-            'business': 12, 
-            'enterprise': 8
-        }
-        
-        if request.plan not in plan_prices:
-            raise HTTPException(status_code=400, detail="Plano inválido")
-        
-        price_per_employee = plan_prices[request.plan]
-        total_amount = price_per_employee * request.employees
-        
-        # Create Stripe checkout session
-        if not STRIPE_API_KEY:
-            raise HTTPException(status_code=500, detail="Stripe not configured")
-        
-        success_url = f"{request.origin_url}/corporate-success?session_id={{CHECKOUT_SESSION_ID}}"
-        cancel_url = f"{request.origin_url}"
-        
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
+        session = await stripe_client.v1.checkout.sessions.create_async({
+            'payment_method_types': ['card'],
+            'line_items': [{
                 'price_data': {
                     'currency': 'brl',
                     'unit_amount': int(total_amount * 100),
@@ -2695,10 +3205,10 @@ async def create_corporate_checkout(request: CorporateCheckoutRequest):
                 },
                 'quantity': 1,
             }],
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
-            metadata={
+            'mode': 'payment',
+            'success_url': success_url,
+            'cancel_url': cancel_url,
+            'metadata': {
                 "type": "corporate_license",
                 "company": request.company,
                 "contact_name": request.name,
@@ -2708,55 +3218,70 @@ async def create_corporate_checkout(request: CorporateCheckoutRequest):
                 "plan": request.plan,
                 "price_per_employee": str(price_per_employee)
             }
-        )
-        
-        # Create corporate payment transaction record
-        transaction = {
-            "id": str(uuid.uuid4()),
-            "session_id": session.id,
-            "type": "corporate_license",
-            "company": request.company,
-            "contact_name": request.name, 
-            "contact_email": request.email,
-            "contact_phone": request.phone,
-            "employees": request.employees,
-            "plan": request.plan,
-            "price_per_employee": price_per_employee,
-            "total_amount": total_amount,
-            "currency": "brl",
-            "payment_status": "pending",
-            "status": "initiated",
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Insert transaction into database
-        await db.corporate_transactions.insert_one(transaction)
-        
-        logger.info(f"Corporate checkout created for {request.company} - {request.employees} employees")
-        
-        return {
-            "success": True,
-            "checkout_url": session.url,
-            "session_id": session.id
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error creating corporate checkout: {e}")
+        }, {
+            # Same request again (double click, retry) on any worker: Stripe replays the same session
+            "idempotency_key": corporate_checkout_idempotency_key(request)
+        })
+    except stripe.StripeError as e:
+        logger.error("Error creating corporate checkout: %s", e)
         raise HTTPException(status_code=500, detail="Erro ao criar checkout corporativo")
+    
+    # Create corporate payment transaction record
+    now = datetime.utcnow()
+    transaction = {
+        "id": _new_id(),
+        "session_id": session.id,
+        "type": "corporate_license",
+        "company": request.company,
+        "contact_name": request.name, 
+        "contact_email": request.email,
+        "contact_phone": request.phone,
+        "employees": request.employees,
+        "plan": request.plan,
+        "price_per_employee": price_per_employee,
+        "total_amount": total_amount,
+        "currency": "brl",
+        "payment_status": "pending",
+        "status": "initiated",
+        "created_at": now,
+        "updated_at": now
+    }
+    
+    # One transaction per session, also when Stripe replayed an existing one
+    try:
+        await db.corporate_transactions.update_one(
+            {"session_id": session.id},
+            {"$setOnInsert": transaction},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+    
+    logger.info("Corporate checkout created for %s - %s employees", request.company, request.employees)
+    
+    return {
+        "success": True,
+        "checkout_url": session.url,
+        "session_id": session.id
+    }
 
 # Include the router in the main app (MUST be after all endpoint definitions)
 app.include_router(api_router)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", 8000)),
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        server_header=False
+    )
@@ -4,8 +4,10 @@ Backend Test Suite for Mercado Pago Preapproval Implementation
 Tests the recurring subscription functionality using Mercado Pago API
 """
 
-import requests
-import json
+import asyncio
+import httpx
+import orjson
+from pathlib import Path
 import uuid
 from datetime import datetime
 import time
@@ -18,7 +20,13 @@ TEST_USER_NAME = "Test User Preapproval"
 
 class BackendTester:
     def __init__(self):
-        self.session = requests.Session()
+        # One pooled async client shared by every test; auth is added per request
+        self.session = httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+        self.auth_headers = {}
         self.auth_token = None
         self.user_id = None
         self.test_results = []
@@ -38,7 +46,7 @@ class BackendTester:
         if details and not success:
             print(f"   Details: {details}")
     
-    def register_test_user(self):
+    async def register_test_user(self):
         """Register a test user for authentication"""
         try:
             payload = {
@@ -48,17 +56,15 @@ class BackendTester:
                 "confirm_password": TEST_USER_PASSWORD
             }
             
-            response = self.session.post(f"{BACKEND_URL}/register", json=payload)
+            response = await self.session.post("/register", json=payload)
             
             if response.status_code == 200:
                 data = response.json()
                 self.auth_token = data.get("access_token")
                 self.user_id = data.get("user", {}).get("id")
                 
-                # Set authorization header for future requests
-                self.session.headers.update({
-                    "Authorization": f"Bearer {self.auth_token}"
-                })
+                # Authorization header for future authenticated requests
+                self.auth_headers = {"Authorization": f"Bearer {self.auth_token}"}
                 
                 self.log_result(
                     "User Registration", 
@@ -79,10 +85,10 @@ class BackendTester:
             self.log_result("User Registration", False, f"Exception: {str(e)}")
             return False
     
-    def test_subscription_plans(self):
+    async def test_subscription_plans(self):
         """Test getting subscription plans"""
         try:
-            response = self.session.get(f"{BACKEND_URL}/subscription/plans")
+            response = await self.session.get("/subscription/plans")
             
             if response.status_code == 200:
                 data = response.json()
@@ -119,7 +125,7 @@ class BackendTester:
             self.log_result("Subscription Plans", False, f"Exception: {str(e)}")
             return False
     
-    def test_preapproval_checkout(self):
+    async def test_preapproval_checkout(self):
         """Test creating preapproval checkout session"""
         try:
             payload = {
@@ -128,7 +134,7 @@ class BackendTester:
                 "cancel_url": "https://example.com/cancel"
             }
             
-            response = self.session.post(f"{BACKEND_URL}/subscription/checkout", json=payload)
+            response = await self.session.post("/subscription/checkout", json=payload, headers=self.auth_headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -176,7 +182,7 @@ class BackendTester:
             self.log_result("Preapproval Checkout Creation", False, f"Exception: {str(e)}")
             return False
     
-    def test_webhook_preapproval_authorized(self):
+    async def test_webhook_preapproval_authorized(self):
         """Test webhook handler with preapproval authorized event"""
         try:
             # Simulate Mercado Pago webhook for preapproval authorized
@@ -188,16 +194,8 @@ class BackendTester:
                 }
             }
             
-            # Remove auth header for webhook (webhooks don't use auth)
-            headers = self.session.headers.copy()
-            if 'Authorization' in headers:
-                del headers['Authorization']
-            
-            response = requests.post(
-                f"{BACKEND_URL}/webhook/mercadopago", 
-                json=webhook_payload,
-                headers=headers
-            )
+            # Webhooks don't use auth, so no Authorization header is sent
+            response = await self.session.post("/webhook/mercadopago", json=webhook_payload)
             
             if response.status_code == 200:
                 data = response.json()
@@ -229,7 +227,7 @@ class BackendTester:
             self.log_result("Webhook Preapproval Handler", False, f"Exception: {str(e)}")
             return False
     
-    def test_webhook_recurring_payment(self):
+    async def test_webhook_recurring_payment(self):
         """Test webhook handler with recurring payment event"""
         try:
             # Simulate Mercado Pago webhook for recurring payment
@@ -240,16 +238,8 @@ class BackendTester:
                 }
             }
             
-            # Remove auth header for webhook
-            headers = self.session.headers.copy()
-            if 'Authorization' in headers:
-                del headers['Authorization']
-            
-            response = requests.post(
-                f"{BACKEND_URL}/webhook/mercadopago", 
-                json=webhook_payload,
-                headers=headers
-            )
+            # Webhooks don't use auth, so no Authorization header is sent
+            response = await self.session.post("/webhook/mercadopago", json=webhook_payload)
             
             if response.status_code == 200:
                 data = response.json()
@@ -281,10 +271,10 @@ class BackendTester:
             self.log_result("Webhook Recurring Payment Handler", False, f"Exception: {str(e)}")
             return False
     
-    def test_subscription_status(self):
+    async def test_subscription_status(self):
         """Test getting subscription status after webhook processing"""
         try:
-            response = self.session.get(f"{BACKEND_URL}/subscription/status")
+            response = await self.session.get("/subscription/status", headers=self.auth_headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -310,11 +300,11 @@ class BackendTester:
             self.log_result("Subscription Status Check", False, f"Exception: {str(e)}")
             return False
     
-    def test_checkout_status(self):
+    async def test_checkout_status(self):
         """Test getting checkout status"""
         try:
             session_id = getattr(self, 'preapproval_session_id', 'test_session_id')
-            response = self.session.get(f"{BACKEND_URL}/subscription/checkout/status/{session_id}")
+            response = await self.session.get(f"/subscription/checkout/status/{session_id}", headers=self.auth_headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -340,29 +330,33 @@ class BackendTester:
             self.log_result("Checkout Status Check", False, f"Exception: {str(e)}")
             return False
     
-    def run_all_tests(self):
+    async def run_all_tests(self):
         """Run all backend tests"""
         print("🚀 Starting Mercado Pago Preapproval Backend Tests")
         print("=" * 60)
         
-        # Test sequence
-        tests = [
-            self.register_test_user,
-            self.test_subscription_plans,
-            self.test_preapproval_checkout,
-            self.test_webhook_preapproval_authorized,
-            self.test_webhook_recurring_payment,
-            self.test_subscription_status,
-            self.test_checkout_status
+        # Test phases: tests within a phase are independent and run concurrently,
+        # each phase relies on state (auth token, preapproval id) set by the previous one
+        phases = [
+            [self.register_test_user],
+            [self.test_subscription_plans, self.test_preapproval_checkout],
+            [
+                self.test_webhook_preapproval_authorized,
+                self.test_webhook_recurring_payment,
+                self.test_checkout_status
+            ],
+            # Reads the state the webhooks above left behind
+            [self.test_subscription_status]
         ]
         
         passed = 0
-        total = len(tests)
+        total = sum(len(phase) for phase in phases)
         
-        for test in tests:
-            if test():
-                passed += 1
-            print()  # Add spacing between tests
+        async with self.session:
+            for phase in phases:
+                results = await asyncio.gather(*(test() for test in phase))
+                passed += sum(1 for result in results if result)
+                print()  # Add spacing between phases
         
         # Summary
         print("=" * 60)
@@ -378,18 +372,18 @@ class BackendTester:
 def main():
     """Main test execution"""
     tester = BackendTester()
-    passed, total, results = tester.run_all_tests()
+    passed, total, results = asyncio.run(tester.run_all_tests())
     
-    # Save detailed results to file
-    with open('/app/test_results_detailed.json', 'w') as f:
-        json.dump({
-            "summary": {
-                "passed": passed,
-                "total": total,
-                "success_rate": f"{(passed/total)*100:.1f}%"
-            },
-            "results": results
-        }, f, indent=2)
+    # Save detailed results to file in a single write
+    payload = {
+        "summary": {
+            "passed": passed,
+            "total": total,
+            "success_rate": f"{(passed/total)*100:.1f}%"
+        },
+        "results": results
+    }
+    Path('/app/test_results_detailed.json').write_bytes(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
     
     return passed == total
 
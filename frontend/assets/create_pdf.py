@@ -3,30 +3,39 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import cm
+from io import BytesIO
+from pathlib import Path
+import hashlib
+import os
 
-def create_mindfulness_ebook():
-    filename = "ebook-mindfulness-preview.pdf"
-    doc = SimpleDocTemplate(filename, pagesize=A4)
-    
-    # Create styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor='#4F46E5',
-        spaceAfter=30,
-        alignment=1  # Center alignment
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor='#64748B',
-        spaceAfter=20,
-        alignment=1
-    )
+# O conteúdo do PDF vem todo deste script; o hash dele identifica a versão gerada
+SOURCE_DIGEST = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()
+
+# Estilos montados uma vez por processo, não a cada build
+styles = getSampleStyleSheet()
+title_style = ParagraphStyle(
+    'CustomTitle',
+    parent=styles['Heading1'],
+    fontSize=24,
+    textColor='#4F46E5',
+    spaceAfter=30,
+    alignment=1  # Center alignment
+)
+
+subtitle_style = ParagraphStyle(
+    'Subtitle',
+    parent=styles['Heading2'],
+    fontSize=16,
+    textColor='#64748B',
+    spaceAfter=20,
+    alignment=1
+)
+
+def build_mindfulness_ebook():
+    """Render the preview ebook and return the PDF bytes"""
+    buffer = BytesIO()
+    # invariant=1 deixa a saída determinística (sem datas), keywords guarda o hash
+    doc = SimpleDocTemplate(buffer, pagesize=A4, keywords=SOURCE_DIGEST, invariant=1)
     
     content = []
     
@@ -89,6 +98,23 @@ def create_mindfulness_ebook():
     ))
     
     doc.build(content)
+    return buffer.getvalue()
+
+def create_mindfulness_ebook():
+    filename = "ebook-mindfulness-preview.pdf"
+    
+    # Conteúdo estático: só refaz o layout quando o script mudar
+    if os.path.exists(filename) and SOURCE_DIGEST.encode() in Path(filename).read_bytes():
+        print(f"PDF já atualizado: {filename}")
+        return
+    
+    pdf_bytes = build_mindfulness_ebook()
+    
+    # Escrita atômica para nunca servir um PDF pela metade
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_filename, filename)
     print(f"PDF criado: {filename}")
 
 if __name__ == "__main__":